@@ -27,7 +27,7 @@ export class IotComputeStack extends cdk.Stack {
 
     // Create lambda
     const assetCode = lambda.Code.fromAsset('../src', {
-      exclude: ['.venv', 'perm_files', 'vendors', 'requirements.txt', '*.pyc', '.pytest_cache', '.chalice'],
+      exclude: ['.venv', 'perm_files', 'vendors', 'requirements.txt', '*.pyc', '.pytest_cache', '.chalice', 'bench', 'test_*.py'],
     })
 
     const layers: Array<lambda.ILayerVersion> = [lambdaPythonVendorsLayer]
@@ -3,17 +3,23 @@ import pickle
 import logging
 import base64
 import boto3
+from botocore.config import Config
 import json
 import secrets
 import uuid
 import os
 from db import DeviceDB
+from topic_routing import load_router, validate_message, FanOutPublisher
+from structured_logging import StructuredLogger, log_invocation
 
 app = Chalice(app_name='iot-poc')
 
 # Set up logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logging.getLogger().setLevel(logging.INFO)
+
+# Sampled, batched logs for the handlers, telemetry info logs are kept at 1%
+telemetry_logger = StructuredLogger('telemetry', {'INFO': 0.01})
+api_logger = StructuredLogger('api')
 
 # Initialize database for devices
 device_db = DeviceDB()
@@ -21,75 +27,136 @@ device_db = DeviceDB()
 # Initialize IoT client
 iot_client = boto3.client('iot')
 
+# Compile the topic routing table once per container
+topic_router = load_router()
+
+# Publishes in flight at once per message, also the size of the IoT data client's connection pool
+MAX_PUBLISH_WORKERS = int(os.environ.get('MAX_PUBLISH_WORKERS', 8))
+
+# Shared fan-out publisher, created on first use since it needs the IoT Core endpoint
+fan_out_publisher = None
+
 
 @app.lambda_function()
+@log_invocation
 def handle_iot_message(event, context):
   """
   AWS Lambda function to process a pickled Python serialization from an IoT message.
+  Batched readings encoded with the time-series codec are decoded to NumPy arrays.
+  Each message is published concurrently to every topic the routing table resolves it to.
   """
+  global fan_out_publisher
   try:
     # Assume the pickled data is passed in the event body
     pickled_data = event.get('data')
     if not pickled_data:
-      logger.error("No pickled data found in the event body.")
+      telemetry_logger.error("No pickled data found in the event body.")
       return {
         'statusCode': 400,
         'body': 'No pickled data provided.'
       }
 
+    # The codec imports NumPy, so only the telemetry handler loads it, not the API routes sharing this module
+    from ts_codec import is_encoded, decode_readings
+
     # Decode the base64-encoded pickled data
     try:
       decoded_data = base64.b64decode(pickled_data)
-      # Deserialize the pickled data
-      deserialized_data = pickle.loads(decoded_data)
-      logger.info("Deserialized data: %s", deserialized_data)
-
-      # Get IoT Core endpoint from environment variable
-      iot_endpoint = os.environ.get('IOT_CORE_ENDPOINT')
-      if not iot_endpoint:
-        logger.error("IOT_CORE_ENDPOINT environment variable not set")
-        return {
-          'statusCode': 500,
-          'body': 'IoT Core endpoint configuration missing'
+      if is_encoded(decoded_data):
+        # Decode the batched readings
+        try:
+          readings = decode_readings(decoded_data)
+        except ValueError as e:
+          telemetry_logger.error("Failed to decode readings: %s", e)
+          return {
+            'statusCode': 400,
+            'body': 'Invalid encoded readings.'
+          }
+        deserialized_data = {
+          'device_id': readings['device_id'],
+          'timestamps': readings['timestamps'].tolist(),
+          'temperatures': readings['values'].tolist(),
         }
-      
-      # Create an IoT data client using the endpoint
-      iot_data_client = boto3.client('iot-data', endpoint_url=f'https://{iot_endpoint}')
-      
-      # Publish message to IoT Core with topic temperatures/json
-      publish_response = iot_data_client.publish(
-          topic='temperatures/json',
-          qos=1,
-          payload=json.dumps(deserialized_data)
-      )
-      
-      logger.info("Published message to IoT Core: %s", publish_response)
+      else:
+        # Deserialize the pickled data
+        deserialized_data = pickle.loads(decoded_data)
+      telemetry_logger.info("Deserialized data: %s", deserialized_data)
+    except TypeError as e:
+      telemetry_logger.error("Base64 decoding error: %s", e)
+      return {
+        'statusCode': 400,
+        'body': 'Invalid base64 encoded data.'
+      }
 
+    # Resolve the topics for this message from the routing table
+    try:
+      validate_message(deserialized_data)
+      topics = topic_router.topics_for(deserialized_data)
+    except ValueError as e:
+      telemetry_logger.error("Invalid message: %s", e)
       return {
-        'statusCode': 200,
-        'body': 'Message processed successfully and published to IoT Core.'
+        'statusCode': 400,
+        'body': f'Invalid message: {e}'
       }
-    except TypeError as e:
-      logger.error("Base64 decoding error: %s", e)
+    if not topics:
+      telemetry_logger.error("Message matches no topic routes")
       return {
         'statusCode': 400,
-        'body': 'Invalid base64 encoded data.'
+        'body': 'Message is missing fields needed for topic routing, or their values are not allowed in topics.'
       }
 
+    # Get IoT Core endpoint from environment variable
+    iot_endpoint = os.environ.get('IOT_CORE_ENDPOINT')
+    if not iot_endpoint:
+      telemetry_logger.error("IOT_CORE_ENDPOINT environment variable not set")
+      return {
+        'statusCode': 500,
+        'body': 'IoT Core endpoint configuration missing'
+      }
+
+    if fan_out_publisher is None:
+      # Create an IoT data client using the endpoint, shared by every publish in this container
+      iot_data_client = boto3.client(
+        'iot-data',
+        endpoint_url=f'https://{iot_endpoint}',
+        config=Config(max_pool_connections=MAX_PUBLISH_WORKERS)
+      )
+      fan_out_publisher = FanOutPublisher(iot_data_client, MAX_PUBLISH_WORKERS)
+
+    # Publish message to IoT Core on every topic concurrently
+    publish_responses = fan_out_publisher.publish(topics, json.dumps(deserialized_data))
+
+    telemetry_logger.info("Published message to IoT Core on %d topics", len(topics), topics=topics)
+    telemetry_logger.debug("Publish responses: %s", publish_responses)
+
+    failed_topics = [topic for topic, response in publish_responses.items() if isinstance(response, Exception)]
+    if failed_topics:
+      telemetry_logger.error("Failed to publish to %d of %d topics", len(failed_topics), len(topics), failed_topics=failed_topics)
+      return {
+        'statusCode': 500,
+        'body': f'Failed to publish to {len(failed_topics)} of {len(topics)} topics.'
+      }
+
+    return {
+      'statusCode': 200,
+      'body': 'Message processed successfully and published to IoT Core.'
+    }
+
   except pickle.UnpicklingError as e:
-    logger.error("Failed to unpickle data: %s", e)
+    telemetry_logger.error("Failed to unpickle data: %s", e)
     return {
       'statusCode': 400,
       'body': 'Invalid pickled data.'
     }
   except Exception as e:
-    logger.error("An error occurred: %s", e)
+    telemetry_logger.error("An error occurred: %s", e)
     return {
       'statusCode': 500,
       'body': 'Internal server error.'
     }
 
 @app.route('/register-device', methods=['POST'])
+@log_invocation(context=lambda: getattr(app, 'lambda_context', None))
 def register_device():
     """
     API endpoint to register a new device with AWS IoT Core.
@@ -98,12 +165,10 @@ def register_device():
     - secret_key: Pre-shared secret key given to device at shipping time
     """
     try:
-        print("Registering device...")
-        print("Request body:", app.current_request.json_body)
         request_body = app.current_request.json_body
         
         if not request_body or 'device_id' not in request_body or 'secret_key' not in request_body:
-            logger.error("Invalid request body")
+            api_logger.error("Invalid request body")
             return {
                 'statusCode': 400,
                 'body': json.dumps({'error': 'Missing required fields: device_id and secret_key'})
@@ -111,10 +176,11 @@ def register_device():
         
         device_id = request_body['device_id']
         secret_key = request_body['secret_key']
+        api_logger.info("Registering device %s", device_id)
         
         # Check if device exists in database with matching secret
         if not device_db.verify_device(device_id, secret_key):
-            logger.error(f"Device verification failed for device: {device_id}")
+            api_logger.error("Device verification failed for device: %s", device_id)
             return {
                 'statusCode': 403,
                 'body': json.dumps({'error': 'Device verification failed'})
@@ -180,7 +246,7 @@ def register_device():
                     policyDocument=json.dumps(policy_document)
                 )
             except iot_client.exceptions.ResourceAlreadyExistsException:
-                logger.info(f"Policy {policy_name} already exists")
+                api_logger.info("Policy %s already exists", policy_name)
             
             # Attach policy to certificate
             iot_client.attach_policy(
@@ -208,14 +274,14 @@ def register_device():
             }
             
         except Exception as e:
-            logger.error(f"Error registering device with IoT Core: {str(e)}")
+            api_logger.error("Error registering device with IoT Core: %s", e)
             return {
                 'statusCode': 500,
                 'body': json.dumps({'error': f'Failed to register device: {str(e)}'})
             }
             
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
+        api_logger.error("Error processing request: %s", e)
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'Internal server error'})
@@ -223,14 +289,13 @@ def register_device():
 
 # Helper endpoints for testing and management
 @app.route('/seed-device', methods=['POST'])
+@log_invocation(context=lambda: getattr(app, 'lambda_context', None))
 def seed_device():
     """
     API endpoint to seed the device database with a new device entry.
     In production, this would be replaced with a more secure provisioning process.
     """
     try:
-        print("Seeding device...")
-        print("Request body:", app.current_request.json_body)
         request_body = app.current_request.json_body
         
         if not request_body or 'device_id' not in request_body:
@@ -240,6 +305,7 @@ def seed_device():
             }
         
         device_id = request_body['device_id']
+        api_logger.info("Seeding device %s", device_id)
         # Generate a random secret for the device
         secret_key = secrets.token_hex(16)
         
@@ -262,7 +328,7 @@ def seed_device():
         }
         
     except Exception as e:
-        logger.error(f"Error seeding device: {str(e)}")
+        api_logger.error("Error seeding device: %s", e)
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'Internal server error'})
@@ -0,0 +1,7 @@
+"""
+Local end-to-end performance bench.
+Runs the Chalice app, the Lambda handler, register_device.py and
+publish-iot-message.py against local stand-ins for DynamoDB, the IoT
+control plane, the IoT data endpoint and API Gateway, so scenarios can be
+measured without a deployed AWS stack. Run with `python -m bench` from src.
+"""
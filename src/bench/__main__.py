@@ -0,0 +1,98 @@
+"""
+Run bench scenarios against the local environment and report per-operation
+throughput, latency percentiles and AWS call counts.
+
+    cd src
+    poetry run python3 -m bench --output baseline.json
+    poetry run python3 -m bench --baseline baseline.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import structured_logging
+from bench.environment import LocalAwsEnvironment
+from bench.metrics import Metrics, format_summary
+from bench import scenarios
+
+SCENARIOS = ['seed', 'register', 'telemetry']
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Local end-to-end performance bench for registration and ingestion")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS, help="Scenarios to run in order (default: all)")
+    parser.add_argument("--seed-devices", type=int, default=10000, help="Devices to seed (default: 10000)")
+    parser.add_argument("--register-devices", type=int, default=1000, help="Devices in the register storm (default: 1000)")
+    parser.add_argument("--telemetry-devices", type=int, default=100, help="Devices sending telemetry (default: 100)")
+    parser.add_argument("--telemetry-rate", type=float, default=200.0, help="Telemetry messages per second (default: 200)")
+    parser.add_argument("--telemetry-duration", type=float, default=30.0, help="Seconds of telemetry (default: 30)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Readings per telemetry message (default: 1)")
+    parser.add_argument("--decimals", type=int, default=None, help="Fixed-point decimals for batched readings (default: exact)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads (default: 16)")
+    parser.add_argument("--lambda-concurrency", type=int, default=8, help="Concurrent handle_iot_message invocations (default: 8)")
+    parser.add_argument("--api-concurrency", type=int, default=16, help="Concurrent API requests, each served by its own app instance (default: 16)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --output")
+    parser.add_argument("--log-level", default="WARNING", help="Log level while running (default: WARNING)")
+    return parser.parse_args()
+
+
+def run_scenario(name, env, metrics, args):
+    """Run one scenario and return a one-line description of what it did."""
+    if name == 'seed':
+        failed = scenarios.seed_devices(env, metrics, args.seed_devices, args.concurrency)
+        return f"Seeded {args.seed_devices} devices ({failed} failed)"
+    if name == 'register':
+        failed = scenarios.register_storm(env, metrics, args.register_devices, args.concurrency)
+        return f"Registered {args.register_devices} devices ({failed} failed)"
+    sent = scenarios.sustained_telemetry(
+        env, metrics, args.telemetry_devices, args.telemetry_rate, args.telemetry_duration,
+        args.concurrency, args.batch_size, args.decimals
+    )
+    return f"Published {sent} messages from {args.telemetry_devices} devices over {args.telemetry_duration:.0f}s"
+
+
+def main():
+    """Start the local environment, run the scenarios and print the report."""
+    args = parse_args()
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    metrics = Metrics()
+    env = LocalAwsEnvironment(metrics, lambda_concurrency=args.lambda_concurrency,
+                              api_concurrency=args.api_concurrency).start()
+    # app.py sets the root level on import
+    logging.getLogger().setLevel(args.log_level)
+
+    results = {}
+    try:
+        for name in args.scenarios:
+            metrics.reset()
+            logs_before = structured_logging.stats()
+            # The app logs to stdout and register_device.py prints every response
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                description = run_scenario(name, env, metrics, args)
+            results[name] = metrics.summary()
+            logs = {key: value - logs_before[key] for key, value in structured_logging.stats().items()}
+            print(f"\n== {name}: {description}\n")
+            print(format_summary(results[name], baseline.get(name)))
+            print(f"\nHandler logs: {logs['bytes_emitted']} bytes in {logs['lines_emitted']} lines, "
+                  f"{logs['records_emitted']} records kept, {logs['records_dropped']} dropped")
+    finally:
+        env.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
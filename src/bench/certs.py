@@ -0,0 +1,68 @@
+"""
+Throwaway certificates for the local HTTPS endpoint, made with the openssl CLI.
+"""
+import os
+import subprocess
+
+SERVER_EXTENSIONS = """\
+basicConstraints=CA:FALSE
+keyUsage=digitalSignature,keyEncipherment
+extendedKeyUsage=serverAuth
+subjectAltName=DNS:localhost,IP:127.0.0.1
+authorityKeyIdentifier=keyid,issuer
+"""
+
+CLIENT_EXTENSIONS = """\
+basicConstraints=CA:FALSE
+keyUsage=digitalSignature,keyEncipherment
+extendedKeyUsage=clientAuth
+authorityKeyIdentifier=keyid,issuer
+"""
+
+
+def _openssl(*args):
+    subprocess.run(['openssl', *args], check=True, capture_output=True)
+
+
+def _issue(directory, name, common_name, extensions):
+    key = os.path.join(directory, f'{name}.key')
+    csr = os.path.join(directory, f'{name}.csr')
+    pem = os.path.join(directory, f'{name}.pem')
+    ext = os.path.join(directory, f'{name}.ext')
+    with open(ext, 'w') as f:
+        f.write(extensions)
+    _openssl('req', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', csr, '-subj', f'/CN={common_name}')
+    _openssl('x509', '-req', '-in', csr, '-CA', os.path.join(directory, 'ca.pem'),
+             '-CAkey', os.path.join(directory, 'ca.key'), '-CAcreateserial',
+             '-out', pem, '-days', '2', '-extfile', ext)
+    return pem, key
+
+
+def create_certificates(directory):
+    """
+    Create a CA, a server certificate for localhost and a device client certificate.
+
+    Args:
+        directory (str): Where to write the files
+
+    Returns:
+        dict: Paths for 'ca', 'server_cert', 'server_key', 'client_cert' and 'client_key'
+
+    Raises:
+        RuntimeError: If the openssl CLI is not available
+    """
+    try:
+        _openssl('req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+                 '-keyout', os.path.join(directory, 'ca.key'), '-out', os.path.join(directory, 'ca.pem'),
+                 '-days', '2', '-subj', '/CN=iot-poc-bench-ca')
+    except FileNotFoundError:
+        raise RuntimeError("The openssl CLI is required to create bench certificates")
+    server_cert, server_key = _issue(directory, 'server', 'localhost', SERVER_EXTENSIONS)
+    client_cert, client_key = _issue(directory, 'client', 'iot-poc-bench-device', CLIENT_EXTENSIONS)
+    return {
+        'ca': os.path.join(directory, 'ca.pem'),
+        'server_cert': server_cert,
+        'server_key': server_key,
+        'client_cert': client_cert,
+        'client_key': client_key,
+    }
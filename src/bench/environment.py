@@ -0,0 +1,119 @@
+"""
+Wires the stand-ins together and points the app's AWS clients at them.
+"""
+import importlib
+import importlib.util
+import logging
+import os
+import tempfile
+from bench.certs import create_certificates
+from bench.stand_ins import (
+    DynamoDBStandIn,
+    IotControlPlaneStandIn,
+    IotDataStandIn,
+    ApiGatewayStandIn,
+    server_ssl_context,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _import_app_copy(app, index):
+    """Import app.py again as a separate module, with its own Chalice app and clients."""
+    spec = importlib.util.spec_from_file_location(f'app_{index}', app.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class LocalAwsEnvironment:
+    """Local DynamoDB, IoT control plane, IoT data endpoint and API Gateway around the app."""
+
+    def __init__(self, metrics, api_key='bench-api-key', iot_data_port=8443, rule_topic='temperatures',
+                 lambda_concurrency=8, api_concurrency=16):
+        """
+        Args:
+            metrics (Metrics): Where every stand-in records its calls
+            api_key (str): API key the API Gateway stand-in requires
+            iot_data_port (int): Port of the HTTPS `/topics/` endpoint, the publisher always uses 8443
+            rule_topic (str): Topic whose device publishes invoke handle_iot_message
+            lambda_concurrency (int): handle_iot_message invocations running at once
+            api_concurrency (int): API requests served at once, each by its own app instance
+        """
+        self.metrics = metrics
+        self.api_key = api_key
+        self.iot_data_port = iot_data_port
+        self.rule_topic = rule_topic
+        self.lambda_concurrency = lambda_concurrency
+        self.api_concurrency = api_concurrency
+        self.directory = tempfile.TemporaryDirectory(prefix='iot-poc-bench-')
+        self.stand_ins = []
+        self.app = None
+
+    def start(self):
+        """
+        Start every stand-in, configure the environment and import the app against it.
+        The app creates its clients on import, so it must not have been imported before.
+        """
+        self.certificates = create_certificates(self.directory.name)
+        with open(self.certificates['client_cert']) as f:
+            client_cert = f.read()
+        with open(self.certificates['client_key']) as f:
+            client_key = f.read()
+
+        self.dynamodb = self._start(DynamoDBStandIn(self.metrics))
+        self.iot = self._start(IotControlPlaneStandIn(self.metrics, client_cert, client_key, '127.0.0.1'))
+        self.iot_data = self._start(IotDataStandIn(
+            self.metrics,
+            rule_topic=self.rule_topic,
+            lambda_concurrency=self.lambda_concurrency,
+            port=self.iot_data_port,
+            ssl_context=server_ssl_context(self.certificates),
+        ))
+
+        os.environ.update({
+            'AWS_ACCESS_KEY_ID': 'bench',
+            'AWS_SECRET_ACCESS_KEY': 'bench',
+            'AWS_DEFAULT_REGION': 'ca-central-1',
+            'AWS_ENDPOINT_URL_DYNAMODB': self.dynamodb.url,
+            'AWS_ENDPOINT_URL_IOT': self.iot.url,
+            # Trust the bench CA for the handler's HTTPS iot-data client
+            'AWS_CA_BUNDLE': self.certificates['ca'],
+            'IOT_CORE_ENDPOINT': f'127.0.0.1:{self.iot_data_port}',
+            'DEVICES_TABLE_NAME': 'IoTDevices',
+        })
+        self.app = importlib.import_module('app')
+        self.iot_data.rule_handler = self.app.handle_iot_message
+        # One app per concurrent API request, like separate Lambda containers
+        apps = [self.app] + [_import_app_copy(self.app, index) for index in range(1, self.api_concurrency)]
+        self.api = self._start(ApiGatewayStandIn(self.metrics, [app.app for app in apps], self.api_key))
+        logger.info(f"Local AWS environment running, API at {self.api.url}")
+        return self
+
+    def _start(self, stand_in):
+        self.stand_ins.append(stand_in.start())
+        return stand_in
+
+    @property
+    def api_url(self):
+        """Base URL of the API Gateway stand-in, as register_device.py expects it."""
+        return self.api.url
+
+    def device_config(self):
+        """Connection settings for publish-iot-message.py, as register_device.py would save them."""
+        return {
+            'endpoint': '127.0.0.1',
+            'certificate_path': self.certificates['client_cert'],
+            'private_key_path': self.certificates['client_key'],
+            'root_ca_path': self.certificates['ca'],
+        }
+
+    def drain(self):
+        """Wait for handler invocations triggered by device publishes."""
+        self.iot_data.drain()
+
+    def stop(self):
+        """Stop every stand-in and remove the certificates."""
+        for stand_in in reversed(self.stand_ins):
+            stand_in.stop()
+        self.directory.cleanup()
@@ -0,0 +1,110 @@
+"""
+Latency and call count collection for bench scenarios.
+"""
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+class Metrics:
+    """Thread-safe latency samples and error counts per operation."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.started_at = time.perf_counter()
+
+    def reset(self):
+        """Drop everything recorded so far and restart the clock."""
+        with self.lock:
+            self.samples = {}
+            self.errors = {}
+            self.started_at = time.perf_counter()
+
+    def record(self, operation, seconds, ok=True):
+        """
+        Record one call.
+
+        Args:
+            operation (str): Operation name, e.g. 'dynamodb.GetItem'
+            seconds (float): How long the call took
+            ok (bool): Whether the call succeeded
+        """
+        with self.lock:
+            self.samples.setdefault(operation, []).append(seconds)
+            if not ok:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    @contextmanager
+    def timed(self, operation):
+        """Time the body of a with-block, counting it as an error if it raises."""
+        started_at = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(operation, time.perf_counter() - started_at, ok)
+
+    def summary(self):
+        """
+        Summarize everything recorded since the last reset.
+
+        Returns:
+            dict: Per operation, the call count, errors, calls per second and
+                latency percentiles in milliseconds
+        """
+        with self.lock:
+            elapsed = time.perf_counter() - self.started_at
+            result = {}
+            for operation, samples in sorted(self.samples.items()):
+                latencies = np.array(samples) * 1000
+                stats = {
+                    'count': len(samples),
+                    'errors': self.errors.get(operation, 0),
+                    'per_second': len(samples) / elapsed if elapsed else 0.0,
+                }
+                for p, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+                    stats[f'p{p}_ms'] = float(value)
+                stats['max_ms'] = float(latencies.max())
+                result[operation] = stats
+            return result
+
+
+def format_summary(summary, baseline=None):
+    """
+    Format a summary as a table, with changes against a baseline summary if given.
+
+    Args:
+        summary (dict): Output of `Metrics.summary`
+        baseline (dict): An earlier summary of the same scenario
+
+    Returns:
+        str: Printable table
+    """
+    lines = [f"{'Operation':<40} {'Count':>8} {'Errors':>7} {'Per s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'Max ms':>9}"]
+    lines.append("-" * len(lines[0]))
+    for operation, stats in summary.items():
+        lines.append(
+            f"{operation:<40} {stats['count']:>8} {stats['errors']:>7} {stats['per_second']:>10.1f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p90_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}"
+        )
+        previous = (baseline or {}).get(operation)
+        if previous:
+            lines.append(
+                f"{'  vs baseline':<40} {_change(stats['count'], previous['count']):>8} {'':>7} "
+                f"{_change(stats['per_second'], previous['per_second']):>10} "
+                f"{_change(stats['p50_ms'], previous['p50_ms']):>9} {_change(stats['p90_ms'], previous['p90_ms']):>9} "
+                f"{_change(stats['p99_ms'], previous['p99_ms']):>9} {_change(stats['max_ms'], previous['max_ms']):>9}"
+            )
+    return "\n".join(lines)
+
+
+def _change(current, previous):
+    if not previous:
+        return "n/a"
+    return f"{(current - previous) / previous * 100:+.0f}%"
@@ -0,0 +1,119 @@
+"""
+Bench scenarios. Each one drives the real client code against the local
+environment and records client-side latencies in the shared metrics,
+next to the calls recorded by the stand-ins.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import register_device
+from rate_control import TokenBucket
+from trace_replay import load_publisher
+
+logger = logging.getLogger(__name__)
+
+
+def _run_all(fn, items, concurrency):
+    """Call fn for every item on a thread pool, logging the first few failures."""
+    failures = []
+
+    def run(item):
+        try:
+            fn(item)
+        except Exception as e:
+            failures.append(e)
+            if len(failures) <= 3:
+                logger.warning(f"{fn.__name__} failed for {item}: {e}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, items))
+    return len(failures)
+
+
+def seed_devices(env, metrics, count=10000, concurrency=16):
+    """
+    Seed devices through API Gateway and the Chalice app into DynamoDB.
+
+    Returns:
+        int: Number of failed seeds
+    """
+    url = f"{env.api_url}/seed-device"
+    headers = {"Content-Type": "application/json", "x-api-key": env.api_key}
+
+    def seed(index):
+        device_id = f"bench-seed-{index:06d}"
+        with metrics.timed('client.seed-device'):
+            response = requests.post(url, headers=headers, json={"device_id": device_id})
+            body = json.loads(response.json().get("body"))
+            if response.status_code != 200 or not body.get("secret_key"):
+                raise Exception(f"Seeding {device_id} failed: {body}")
+
+    return _run_all(seed, range(count), concurrency)
+
+
+def register_storm(env, metrics, count=1000, concurrency=16):
+    """
+    Register many new devices at once with register_device.register_device,
+    which seeds each device and then registers it with the IoT control plane.
+
+    Returns:
+        int: Number of failed registrations
+    """
+    def register(index):
+        device_id = f"bench-register-{index:06d}"
+        with metrics.timed('client.register_device'):
+            body = register_device.register_device(env.api_url, env.api_key, device_id)
+            if 'thingName' not in body:
+                raise Exception(f"Registering {device_id} failed: {body}")
+
+    return _run_all(register, range(count), concurrency)
+
+
+def sustained_telemetry(env, metrics, devices=100, rate=200.0, duration=30.0, concurrency=16,
+                        batch_size=1, decimals=None, topic='temperatures'):
+    """
+    Publish telemetry with publish-iot-message.py at a steady total rate. Publishes
+    to the rule topic invoke handle_iot_message, which fans out through iot-data.
+
+    Args:
+        devices (int): Device ids to spread messages over
+        rate (float): Messages per second across all devices
+        duration (float): Seconds to keep publishing
+        concurrency (int): Publishing threads
+        batch_size (int): Readings per message
+        decimals (int): Fixed-point decimals for batched readings
+
+    Returns:
+        int: Number of messages published
+    """
+    publisher = load_publisher()
+    config = env.device_config()
+    bucket = TokenBucket(rate, capacity=1.0)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    sent = [0]
+
+    def publish(worker):
+        while True:
+            with lock:
+                delay = bucket.reserve()
+            if time.monotonic() + delay >= deadline:
+                return
+            time.sleep(delay)
+            device_id = f"bench-device-{random.randrange(devices):06d}"
+            with metrics.timed('client.publish_iot_message'):
+                publisher.publish_iot_message(
+                    config['endpoint'], device_id, topic, config['root_ca_path'],
+                    config['certificate_path'], config['private_key_path'],
+                    batch_size=batch_size, decimals=decimals
+                )
+            with lock:
+                sent[0] += 1
+
+    _run_all(publish, range(concurrency), concurrency)
+    env.drain()
+    return sent[0]
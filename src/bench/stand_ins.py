@@ -0,0 +1,378 @@
+"""
+Local HTTP stand-ins for the AWS services the app talks to.
+Each stand-in speaks enough of the real wire protocol for boto3, requests
+and the Chalice app to work unchanged, and records every call it serves.
+"""
+import base64
+import json
+import queue
+import re
+import ssl
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 512
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes, avoid Nagle/delayed ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status, payload, headers = self.server.stand_in.serve(self.command, self.path, self.headers, body)
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode('utf-8')
+        elif isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self.send_response(status)
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+
+class StandIn:
+    """Base class running a stand-in on a local port in a background thread."""
+
+    service = None
+
+    def __init__(self, metrics, port=0, ssl_context=None):
+        """
+        Args:
+            metrics (Metrics): Where served calls are recorded, as '<service>.<operation>'
+            port (int): Port to listen on, 0 for any free port
+            ssl_context (ssl.SSLContext): Serve HTTPS with this context
+        """
+        self.metrics = metrics
+        self.port = port
+        self.ssl_context = ssl_context
+        self.server = None
+
+    @property
+    def url(self):
+        scheme = 'https' if self.ssl_context else 'http'
+        return f"{scheme}://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        """Start serving in a daemon thread."""
+        self.server = _Server(('127.0.0.1', self.port), _Handler)
+        self.server.stand_in = self
+        if self.ssl_context:
+            # Handshake in the request thread, not in the accept loop
+            self.server.socket = self.ssl_context.wrap_socket(
+                self.server.socket, server_side=True, do_handshake_on_connect=False)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def serve(self, method, path, headers, body):
+        """Handle one request and record it."""
+        started_at = time.perf_counter()
+        operation, status, payload, response_headers = self.handle(method, path, headers, body)
+        self.metrics.record(f"{self.service}.{operation}", time.perf_counter() - started_at, status < 400)
+        return status, payload, response_headers
+
+    def handle(self, method, path, headers, body):
+        """
+        Returns:
+            tuple: (operation name, status code, response body, extra headers)
+        """
+        raise NotImplementedError
+
+
+class DynamoDBStandIn(StandIn):
+    """In-memory DynamoDB speaking the JSON 1.0 protocol for the calls DeviceDB makes."""
+
+    service = 'dynamodb'
+
+    def __init__(self, metrics, key_name='device_id', **kwargs):
+        super().__init__(metrics, **kwargs)
+        self.key_name = key_name
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def handle(self, method, path, headers, body):
+        operation = headers.get('X-Amz-Target', '').split('.')[-1]
+        request = json.loads(body or b'{}')
+        handler = getattr(self, f'_{operation}', None)
+        if handler is None:
+            return operation or 'Unknown', 400, _dynamodb_error('UnknownOperationException', operation), None
+        with self.lock:
+            table = self.tables.setdefault(request.get('TableName'), {})
+            return (operation, 200, handler(table, request), None)
+
+    def _key(self, key):
+        return json.dumps(key[self.key_name], sort_keys=True)
+
+    def _GetItem(self, table, request):
+        item = table.get(self._key(request['Key']))
+        return {'Item': item} if item is not None else {}
+
+    def _PutItem(self, table, request):
+        table[self._key(request['Item'])] = request['Item']
+        return {}
+
+    def _UpdateItem(self, table, request):
+        item = table.setdefault(self._key(request['Key']), dict(request['Key']))
+        names = request.get('ExpressionAttributeNames', {})
+        values = request.get('ExpressionAttributeValues', {})
+        # Only SET clauses are used by DeviceDB
+        assignments = re.sub(r'^\s*SET\s+', '', request['UpdateExpression'], flags=re.IGNORECASE)
+        for assignment in assignments.split(','):
+            name, value = (part.strip() for part in assignment.split('='))
+            item[names.get(name, name)] = values[value]
+        return {}
+
+    def _Scan(self, table, request):
+        items = list(table.values())
+        return {'Items': items, 'Count': len(items), 'ScannedCount': len(items)}
+
+
+def _dynamodb_error(code, message):
+    return {'__type': f'com.amazonaws.dynamodb.v20120810#{code}', 'message': message}
+
+
+class IotControlPlaneStandIn(StandIn):
+    """IoT control plane (rest-json) for the calls the device registration route makes."""
+
+    service = 'iot'
+
+    ROUTES = [
+        ('POST', re.compile(r'^/things/([^/]+)$'), 'CreateThing'),
+        ('POST', re.compile(r'^/keys-and-certificate$'), 'CreateKeysAndCertificate'),
+        ('PUT', re.compile(r'^/things/([^/]+)/principals$'), 'AttachThingPrincipal'),
+        ('POST', re.compile(r'^/policies/([^/]+)$'), 'CreatePolicy'),
+        ('PUT', re.compile(r'^/target-policies/([^/]+)$'), 'AttachPolicy'),
+        ('GET', re.compile(r'^/endpoint$'), 'DescribeEndpoint'),
+    ]
+
+    def __init__(self, metrics, certificate_pem, private_key, endpoint_address, **kwargs):
+        """
+        Args:
+            metrics (Metrics): Where served calls are recorded
+            certificate_pem (str): Certificate handed to every registered device
+            private_key (str): Private key handed to every registered device
+            endpoint_address (str): Returned by DescribeEndpoint
+        """
+        super().__init__(metrics, **kwargs)
+        self.certificate_pem = certificate_pem
+        self.private_key = private_key
+        self.endpoint_address = endpoint_address
+        self.things = {}
+        self.policies = {}
+        self.lock = threading.Lock()
+
+    def handle(self, method, path, headers, body):
+        path = urlsplit(path).path
+        for route_method, pattern, operation in self.ROUTES:
+            match = pattern.match(path)
+            if method == route_method and match:
+                name = unquote(match.group(1)) if match.groups() else None
+                request = json.loads(body or b'{}')
+                with self.lock:
+                    status, payload, response_headers = getattr(self, f'_{operation}')(name, request, headers)
+                return operation, status, payload, response_headers
+        return 'Unknown', 404, {'message': f'No route for {method} {path}'}, {'x-amzn-ErrorType': 'ResourceNotFoundException'}
+
+    def _CreateThing(self, name, request, headers):
+        thing = self.things.setdefault(name, {'thingId': uuid.uuid4().hex, 'principals': set()})
+        return 200, {'thingName': name, 'thingArn': f'arn:aws:iot:local:000000000000:thing/{name}', 'thingId': thing['thingId']}, None
+
+    def _CreateKeysAndCertificate(self, name, request, headers):
+        certificate_id = uuid.uuid4().hex + uuid.uuid4().hex
+        return 200, {
+            'certificateId': certificate_id,
+            'certificateArn': f'arn:aws:iot:local:000000000000:cert/{certificate_id}',
+            'certificatePem': self.certificate_pem,
+            'keyPair': {'PublicKey': '', 'PrivateKey': self.private_key},
+        }, None
+
+    def _AttachThingPrincipal(self, name, request, headers):
+        if name not in self.things:
+            return 404, {'message': f'Thing {name} not found'}, {'x-amzn-ErrorType': 'ResourceNotFoundException'}
+        self.things[name]['principals'].add(headers.get('x-amzn-principal'))
+        return 200, {}, None
+
+    def _CreatePolicy(self, name, request, headers):
+        if name in self.policies:
+            return 409, {'message': f'Policy {name} already exists'}, {'x-amzn-ErrorType': 'ResourceAlreadyExistsException'}
+        self.policies[name] = {'document': request.get('policyDocument'), 'targets': set()}
+        return 200, {'policyName': name, 'policyArn': f'arn:aws:iot:local:000000000000:policy/{name}', 'policyVersionId': '1'}, None
+
+    def _AttachPolicy(self, name, request, headers):
+        if name not in self.policies:
+            return 404, {'message': f'Policy {name} not found'}, {'x-amzn-ErrorType': 'ResourceNotFoundException'}
+        self.policies[name]['targets'].add(request.get('target'))
+        return 200, {}, None
+
+    def _DescribeEndpoint(self, name, request, headers):
+        return 200, {'endpointAddress': self.endpoint_address}, None
+
+
+class IotDataStandIn(StandIn):
+    """
+    HTTPS `/topics/` endpoint serving both device publishes (client certificates,
+    publish-iot-message.py) and signed `iot-data` publishes from the Lambda handler.
+    Device publishes to the rule topic invoke the handler on a pool of workers,
+    like the IoT rule that triggers the Lambda in AWS.
+    """
+
+    service = 'iot-data'
+
+    def __init__(self, metrics, rule_topic='temperatures', rule_handler=None, lambda_concurrency=8, **kwargs):
+        """
+        Args:
+            metrics (Metrics): Where served calls and handler invocations are recorded
+            rule_topic (str): Topic whose device publishes invoke the rule handler
+            rule_handler (callable): Lambda handler taking (event, context)
+            lambda_concurrency (int): Handler invocations running at once
+        """
+        super().__init__(metrics, **kwargs)
+        self.rule_topic = rule_topic
+        self.rule_handler = rule_handler
+        self.executor = ThreadPoolExecutor(max_workers=lambda_concurrency, thread_name_prefix='rule')
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def handle(self, method, path, headers, body):
+        url = urlsplit(path)
+        if method != 'POST' or not url.path.startswith('/topics/'):
+            return 'Unknown', 404, {'message': f'No route for {method} {url.path}'}, None
+        topic = unquote(url.path[len('/topics/'):])
+        # Signed requests come from boto3, unsigned ones from devices using certificates
+        if 'Authorization' in headers:
+            return 'Publish', 200, {}, None
+        if topic == self.rule_topic and self.rule_handler:
+            future = self.executor.submit(self._invoke_rule, body)
+            with self.lock:
+                self.pending.append(future)
+        return 'DevicePublish', 200, {'message': 'OK', 'traceId': uuid.uuid4().hex}, None
+
+    def _invoke_rule(self, payload):
+        event = {'data': base64.b64encode(payload).decode('utf-8')}
+        started_at = time.perf_counter()
+        response = self.rule_handler(event, _lambda_context())
+        self.metrics.record('lambda.handle_iot_message', time.perf_counter() - started_at,
+                            response.get('statusCode') == 200)
+
+    def drain(self):
+        """Wait for every handler invocation triggered so far."""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        wait(pending)
+
+    def stop(self):
+        super().stop()
+        self.executor.shutdown(wait=True)
+
+
+class ApiGatewayStandIn(StandIn):
+    """
+    REST API routing `/<stage>/<resource>` to the Chalice app with API key checks.
+    A Chalice app holds the current request on the app object, so each app instance
+    serves one request at a time, the same way one Lambda container does. Requests
+    run concurrently on a pool of separately imported instances, like Lambda scaling
+    out containers, and wait for a free one when all are busy. The wait is recorded
+    as `apigateway.queue_wait` and the app's own time as `lambda.<operation>`.
+    """
+
+    service = 'apigateway'
+
+    def __init__(self, metrics, chalice_apps, api_key, stage='api', **kwargs):
+        """
+        Args:
+            metrics (Metrics): Where served calls are recorded
+            chalice_apps (list): Chalice app instances to invoke, one request at a time each
+            api_key (str): Required value of the x-api-key header
+            stage (str): Stage name prefixing every path
+        """
+        super().__init__(metrics, **kwargs)
+        self.api_key = api_key
+        self.stage = stage
+        self.instances = queue.Queue()
+        for chalice_app in chalice_apps:
+            self.instances.put(chalice_app)
+
+    @property
+    def url(self):
+        return f"{super().url}/{self.stage}"
+
+    def handle(self, method, path, headers, body):
+        url = urlsplit(path)
+        prefix = f'/{self.stage}'
+        if not url.path.startswith(prefix + '/'):
+            return 'NotFound', 404, {'message': 'Missing Authentication Token'}, None
+        resource = url.path[len(prefix):]
+        operation = f'{method} {resource}'
+        if headers.get('x-api-key') != self.api_key:
+            return operation, 403, {'message': 'Forbidden'}, None
+
+        query = {name: values for name, values in parse_qs(url.query).items()}
+        event = {
+            'resource': resource,
+            'path': resource,
+            'httpMethod': method,
+            'headers': dict(headers.items()),
+            'multiValueHeaders': {name: headers.get_all(name) for name in headers.keys()},
+            'queryStringParameters': {name: values[-1] for name, values in query.items()} or None,
+            'multiValueQueryStringParameters': query or None,
+            'pathParameters': None,
+            'stageVariables': None,
+            'requestContext': {'resourcePath': resource, 'httpMethod': method, 'stage': self.stage},
+            'body': body.decode('utf-8') if body else None,
+            'isBase64Encoded': False,
+        }
+        queued_at = time.perf_counter()
+        chalice_app = self.instances.get()
+        started_at = time.perf_counter()
+        self.metrics.record('apigateway.queue_wait', started_at - queued_at)
+        try:
+            response = chalice_app(event, _lambda_context())
+        finally:
+            self.instances.put(chalice_app)
+        self.metrics.record(f'lambda.{operation}', time.perf_counter() - started_at, response['statusCode'] < 400)
+
+        response_body = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            response_body = base64.b64decode(response_body)
+        return operation, response['statusCode'], response_body, response.get('headers')
+
+
+def _lambda_context():
+    """The part of a Lambda context the app reads: a fresh request id per invocation."""
+    return SimpleNamespace(aws_request_id=str(uuid.uuid4()))
+
+
+def server_ssl_context(certificates):
+    """
+    Build the server TLS context for the `/topics/` endpoint.
+    Client certificates are verified when presented but not required,
+    since signed boto3 requests do not carry one.
+    """
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH, cafile=certificates['ca'])
+    context.load_cert_chain(certificates['server_cert'], certificates['server_key'])
+    context.verify_mode = ssl.CERT_OPTIONAL
+    return context
@@ -0,0 +1,69 @@
+import argparse
+import importlib.util
+import json
+import os
+import pickle
+import random
+import time
+from ts_codec import encode_readings, decode_readings
+
+# publish-iot-message.py is not importable by name, load it from its path
+_spec = importlib.util.spec_from_file_location(
+  'publish_iot_message', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'publish-iot-message.py'))
+publish_iot_message = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(publish_iot_message)
+
+
+def generate_trace(count, interval=5):
+  """Generates `count` readings with generate_temperature, `interval` seconds apart."""
+  start_ms = int(time.time() * 1000)
+  timestamps = [start_ms + i * interval * 1000 for i in range(count)]
+  temperatures = [publish_iot_message.generate_temperature() for _ in range(count)]
+  return timestamps, temperatures
+
+
+def build_encoders(device_id, timestamps, temperatures):
+  """Returns (name, payload, decode function) for each encoding under test."""
+  message = {"device_id": device_id, "timestamps": timestamps, "temperatures": temperatures}
+  return [
+    ("pickle", pickle.dumps(message), pickle.loads),
+    ("json", json.dumps(message).encode('utf-8'), json.loads),
+    ("ts-codec xor", encode_readings(device_id, timestamps, temperatures), decode_readings),
+    ("ts-codec 2 decimals", encode_readings(device_id, timestamps, temperatures, 2), decode_readings),
+    ("ts-codec 1 decimal", encode_readings(device_id, timestamps, temperatures, 1), decode_readings),
+  ]
+
+
+def time_decode(decode, payload, min_seconds=0.2):
+  """Returns the mean seconds per decode, repeating until `min_seconds` have elapsed."""
+  runs = 0
+  started_at = time.perf_counter()
+  elapsed = 0.0
+  while elapsed < min_seconds:
+    decode(payload)
+    runs += 1
+    elapsed = time.perf_counter() - started_at
+  return elapsed / runs
+
+
+def run_benchmark(batch_sizes):
+  """Prints bytes per reading and decode throughput for each encoding and batch size."""
+  single = pickle.dumps({"device_id": "device-0001", "temperature": publish_iot_message.generate_temperature()})
+  print(f"Current wire format (one pickled dict per reading): {len(single)} bytes per reading\n")
+
+  print(f"{'Batch':<8} {'Encoding':<22} {'Bytes':<10} {'Bytes/reading':<15} {'Decode (readings/s)':<20}")
+  print("-" * 78)
+  for batch_size in batch_sizes:
+    timestamps, temperatures = generate_trace(batch_size)
+    for name, payload, decode in build_encoders("device-0001", timestamps, temperatures):
+      seconds = time_decode(decode, payload)
+      print(f"{batch_size:<8} {name:<22} {len(payload):<10} {len(payload) / batch_size:<15.2f} {batch_size / seconds:<20,.0f}")
+    print()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Compare the time-series codec with pickle and JSON")
+  parser.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Readings per payload (default: 10 100 1000 10000)")
+  args = parser.parse_args()
+  random.seed(0)
+  run_benchmark(args.batch_sizes)
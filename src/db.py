@@ -2,13 +2,13 @@
 Device database module using DynamoDB.
 This implementation uses AWS DynamoDB for persistent device storage.
 """
-import logging
 import boto3
 from boto3.dynamodb.conditions import Key, Attr
 from datetime import datetime
 import os
+from structured_logging import StructuredLogger
 
-logger = logging.getLogger()
+logger = StructuredLogger('db')
 
 class DeviceDB:
     """DynamoDB-based database for IoT device registration and verification."""
@@ -18,7 +18,7 @@ class DeviceDB:
         self.dynamodb = boto3.resource('dynamodb')
         self.table_name = os.environ.get('DEVICES_TABLE_NAME', 'IoTDevices')
         self.table = self.dynamodb.Table(self.table_name)
-        logger.info(f"DynamoDB device database initialized with table {self.table_name}")
+        logger.info("DynamoDB device database initialized with table %s", self.table_name)
     
     def add_device(self, device_id, secret_key):
         """
@@ -35,7 +35,7 @@ class DeviceDB:
             # Check if device already exists
             response = self.table.get_item(Key={'device_id': device_id})
             if 'Item' in response:
-                logger.warning(f"Device ID {device_id} already exists in database")
+                logger.warning("Device ID %s already exists in database", device_id)
                 return False
             
             # Add new device
@@ -51,11 +51,11 @@ class DeviceDB:
                 }
             )
             
-            logger.info(f"Added device {device_id} to database")
+            logger.info("Added device %s to database", device_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error adding device to DynamoDB: {str(e)}")
+            logger.error("Error adding device to DynamoDB: %s", e)
             return False
     
     def verify_device(self, device_id, secret_key):
@@ -73,19 +73,19 @@ class DeviceDB:
             response = self.table.get_item(Key={'device_id': device_id})
             
             if 'Item' not in response:
-                logger.warning(f"Device {device_id} not found in database")
+                logger.warning("Device %s not found in database", device_id)
                 return False
                 
             stored_secret = response['Item'].get('secret_key')
             if stored_secret != secret_key:
-                logger.warning(f"Secret key mismatch for device {device_id}")
+                logger.warning("Secret key mismatch for device %s", device_id)
                 return False
                 
-            logger.info(f"Device {device_id} verified successfully")
+            logger.info("Device %s verified successfully", device_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error verifying device in DynamoDB: {str(e)}")
+            logger.error("Error verifying device in DynamoDB: %s", e)
             return False
     
     def mark_as_registered(self, device_id, thing_name):
@@ -103,7 +103,7 @@ class DeviceDB:
             # Check if device exists
             response = self.table.get_item(Key={'device_id': device_id})
             if 'Item' not in response:
-                logger.warning(f"Cannot mark non-existent device {device_id} as registered")
+                logger.warning("Cannot mark non-existent device %s as registered", device_id)
                 return False
             
             # Update device registration status
@@ -118,11 +118,11 @@ class DeviceDB:
                 }
             )
             
-            logger.info(f"Device {device_id} marked as registered with thing name {thing_name}")
+            logger.info("Device %s marked as registered with thing name %s", device_id, thing_name)
             return True
             
         except Exception as e:
-            logger.error(f"Error updating device in DynamoDB: {str(e)}")
+            logger.error("Error updating device in DynamoDB: %s", e)
             return False
     
     def get_device(self, device_id):
@@ -143,7 +143,7 @@ class DeviceDB:
             return response['Item']
             
         except Exception as e:
-            logger.error(f"Error retrieving device from DynamoDB: {str(e)}")
+            logger.error("Error retrieving device from DynamoDB: %s", e)
             return None
     
     def get_all_devices(self):
@@ -158,5 +158,5 @@ class DeviceDB:
             return response.get('Items', [])
             
         except Exception as e:
-            logger.error(f"Error scanning devices in DynamoDB: {str(e)}")
+            logger.error("Error scanning devices in DynamoDB: %s", e)
             return []
\ No newline at end of file
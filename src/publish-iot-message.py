@@ -6,6 +6,8 @@ import json
 import argparse
 import os
 import logging
+from rate_control import AdaptiveSendController
+from ts_codec import encode_readings
 
 # Configure logging
 logging.basicConfig(
@@ -20,7 +22,20 @@ def parse_args():
     parser.add_argument("--config", required=True, help="Path to the configuration JSON file")
     parser.add_argument("--interval", type=int, default=5, help="Interval between messages in seconds (default: 5)")
     parser.add_argument("--topic", required=True, help="Custom topic to publish messages to (overrides default topic)")
-    return parser.parse_args()
+    parser.add_argument("--min-rate", type=float, default=None, help="Lowest send rate in messages per second when throttled (default: 1/10 of the --interval rate)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Readings per message; above 1 they are sent with the time-series codec (default: 1)")
+    parser.add_argument("--decimals", type=int, default=None, help="Round batched readings to this many decimals for tighter compression (default: exact)")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per message on throttling or server errors (default: 5)")
+    args = parser.parse_args()
+    # Together they set the top send rate, so neither can be zero
+    if args.interval < 1:
+        parser.error("--interval must be at least 1 second")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    max_rate = 1.0 / (args.interval * args.batch_size)
+    if args.min_rate is not None and not 0 < args.min_rate <= max_rate:
+        parser.error(f"--min-rate must be above 0 and at most {max_rate:g} messages per second, the --interval rate")
+    return args
 
 def load_config(config_path):
     """Load configuration from JSON file."""
@@ -51,21 +66,51 @@ def generate_temperature(mean=80, std_dev=10):
         if 40 <= temperature <= 120:
             return temperature
 
-def publish_iot_message(endpoint_url, device_id, topic, root_cert, cert_pem, private_pem):
+def encode_payload(device_id, temperatures, timestamps=None, interval=5, decimals=None):
     """
-    Publish a pickled message containing a temperature value to an AWS IoT HTTPS endpoint.
+    Encode readings the way they are published: a single reading is pickled,
+    several are encoded together with the time-series codec.
+
+    Args:
+        device_id (str): Device the readings belong to
+        temperatures (list): Temperature readings, oldest first
+        timestamps (list): Reading times in ms, defaults to every `interval` seconds up to now
+        interval (int): Seconds between generated timestamps
+        decimals (int): Fixed-point decimals for batched readings, exact floats if None
+
+    Returns:
+        bytes: Message payload
     """
-    # Generate temperature
-    temperature = generate_temperature()
+    if len(temperatures) > 1:
+        if timestamps is None:
+            now_ms = int(time.time() * 1000)
+            timestamps = [now_ms - (len(temperatures) - 1 - i) * interval * 1000 for i in range(len(temperatures))]
+        return encode_readings(device_id, timestamps, temperatures, decimals)
 
     # Create the message
     message = {
         "device_id": device_id,
-        "temperature": temperature,
+        "temperature": temperatures[0],
     }
 
     # Pickle the message
-    pickled_message = pickle.dumps(message)
+    return pickle.dumps(message)
+
+def publish_iot_message(endpoint_url, device_id, topic, root_cert, cert_pem, private_pem, controller=None,
+                        batch_size=1, interval=5, decimals=None, timestamps=None, temperatures=None):
+    """
+    Publish a pickled message containing a temperature value to an AWS IoT HTTPS endpoint.
+    With a batch size above 1, the readings taken every `interval` seconds since the
+    last message are sent together, encoded with the time-series codec.
+    Recorded readings can be passed in with `temperatures` (and `timestamps` in ms).
+    When a controller is given, throttled and failed sends are retried through it.
+    """
+    # Generate temperatures
+    if temperatures is None:
+        temperatures = [generate_temperature() for _ in range(batch_size)]
+    batch_size = len(temperatures)
+    temperature = temperatures[-1]
+    payload = encode_payload(device_id, temperatures, timestamps, interval, decimals)
 
     # Define headers
     headers = {
@@ -73,26 +118,32 @@ def publish_iot_message(endpoint_url, device_id, topic, root_cert, cert_pem, pri
         # 'Content-Type': 'application/json'
     }
 
-    # Send the request
-    try:
-        # create and format values for HTTPS request
-        publish_url = 'https://' + endpoint_url + ':8443/topics/' + topic + '?qos=1'
-        # make request
-        publish = requests.request('POST',
+    # create and format values for HTTPS request
+    publish_url = 'https://' + endpoint_url + ':8443/topics/' + topic + '?qos=1'
+
+    def send():
+        return requests.request('POST',
                     publish_url,
                     headers=headers,
                     # data=json.dumps(message).encode('utf-8'),
-                    data=pickled_message,
+                    data=payload,
                     verify=root_cert,
                     cert=(cert_pem, private_pem)
                 )
+
+    # Send the request
+    try:
+        publish = controller.send(send) if controller else send()
+        if publish is None:
+          logger.error("Failed to publish message: all attempts raised")
+          return
         if publish.status_code != 200:
           logger.error(f"Failed to publish message. Status code: {publish.status_code}")
           logger.error(f"Response: {publish.text}")
           return
         else:
           logger.info(f"Message published with: {publish.status_code}")
-          logger.info(f"Temperature: {temperature:.2f}°C")
+          logger.info(f"Temperature: {temperature:.2f}°C ({batch_size} readings, {len(payload)} bytes)")
           logger.debug(f"Response:\n{publish.text}")
     except Exception as e:
         logger.error(f"Failed to publish message: {e}")
@@ -119,11 +170,20 @@ def main():
     logger.info(f"Publishing messages for device: {device_id}")
     logger.info(f"Using endpoint: {endpoint_url}")
     logger.info(f"Publishing to topic: {topic}")
+
+    # The interval sets the top speed, the controller backs off from it when throttled
+    controller = AdaptiveSendController(
+        max_rate=1.0 / (args.interval * args.batch_size),
+        min_rate=args.min_rate,
+        max_retries=args.max_retries
+    )
     
     try:
         while True:
-            publish_iot_message(endpoint_url, device_id, topic, root_cert, cert_pem, private_pem)
-            time.sleep(args.interval)
+            time.sleep(controller.reserve())
+            publish_iot_message(endpoint_url, device_id, topic, root_cert, cert_pem, private_pem, controller,
+                                args.batch_size, args.interval, args.decimals)
+            logger.debug(f"Send stats: {controller.stats()}")
     except KeyboardInterrupt:
         logger.info("Script terminated by user")
     except Exception as e:
@@ -0,0 +1,372 @@
+"""
+Adaptive send rate control for device publishers.
+Combines a token bucket, AIMD rate adjustment driven by response codes and
+latency, and retries with decorrelated-jitter backoff so that a fleet
+recovering from an outage settles on a rate the endpoint can sustain.
+"""
+import argparse
+import heapq
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean "slow down" rather than "something is broken"
+THROTTLE_STATUS_CODES = {429, 503}
+RETRYABLE_STATUS_CODES = {500, 502, 504}
+
+OUTCOME_OK = 'ok'
+OUTCOME_THROTTLED = 'throttled'
+OUTCOME_RETRY = 'retry'
+OUTCOME_FAILED = 'failed'
+
+
+class TokenBucket:
+    """Token bucket that hands out send reservations at a configurable rate."""
+
+    def __init__(self, rate, capacity=1.0, clock=time.monotonic):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens that can accumulate (burst size)
+            clock (callable): Monotonic clock returning seconds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def set_rate(self, rate):
+        """Change the refill rate, crediting tokens earned at the old rate first."""
+        self._refill()
+        self.rate = rate
+
+    def wait_time(self):
+        """Return the seconds until a token is available, without taking it."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def reserve(self):
+        """
+        Take one token, going into debt if none is available.
+
+        Returns:
+            float: Seconds the caller must wait before using the token
+        """
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class DecorrelatedJitterBackoff:
+    """Decorrelated-jitter backoff: sleep = min(cap, uniform(base, previous * 3))."""
+
+    def __init__(self, base=0.5, cap=60.0, rng=None):
+        """
+        Args:
+            base (float): Smallest delay in seconds
+            cap (float): Largest delay in seconds
+            rng (random.Random): Random source, defaults to the global one
+        """
+        self.base = base
+        self.cap = cap
+        self.rng = rng or random
+        self.previous = base
+
+    def next_delay(self, base=None):
+        """
+        Return the next delay in seconds and remember it for the following call.
+
+        Args:
+            base (float): Smallest delay for this call, overriding the configured base
+        """
+        base = self.base if base is None else base
+        self.previous = min(self.cap, self.rng.uniform(base, max(base, self.previous) * 3))
+        return self.previous
+
+    def reset(self):
+        """Start over from the base delay after a successful send."""
+        self.previous = self.base
+
+
+class AdaptiveSendController:
+    """
+    Paces sends for one device and adapts the pace to how the endpoint responds.
+
+    Successful, fast responses raise the rate additively up to `max_rate`.
+    Throttling responses (429/503) cut it multiplicatively, and responses slower
+    than `latency_target` cut it gently. Failed sends are retried with
+    decorrelated-jitter backoff. Retries wait until a token is available but do
+    not take it, so a long retry sequence cannot put the bucket into debt and
+    hold back the sends after it. The first reservation after a retry sequence
+    starts at a random point in the send period, so devices knocked into step
+    by an outage spread out again.
+    """
+
+    def __init__(self, max_rate, min_rate=None, initial_rate=None, increase=None,
+                 decrease=0.5, latency_target=2.0, latency_decrease=0.9,
+                 burst=1.0, base_delay=None, max_delay=60.0, max_retries=5,
+                 clock=time.monotonic, rng=None):
+        """
+        Args:
+            max_rate (float): Highest send rate in messages per second
+            min_rate (float): Lowest send rate, defaults to max_rate / 10 and never above max_rate
+            initial_rate (float): Starting rate, defaults to max_rate
+            increase (float): Rate added per successful send, defaults to max_rate / 10
+            decrease (float): Factor applied to the rate on throttling
+            latency_target (float): Response time in seconds above which the rate is reduced
+            latency_decrease (float): Factor applied to the rate on slow responses
+            burst (float): Token bucket capacity
+            base_delay (float): Smallest retry delay in seconds, defaults to the current send
+                period so a retrying device never sends faster than a healthy one
+            max_delay (float): Largest retry delay in seconds
+            max_retries (int): Retries per message before it is dropped
+            clock (callable): Monotonic clock returning seconds
+            rng (random.Random): Random source for backoff jitter
+        """
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate) if min_rate is not None else max_rate / 10
+        self.increase = increase if increase is not None else max_rate / 10
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.latency_decrease = latency_decrease
+        self.max_retries = max_retries
+        self.clock = clock
+        self.rng = rng or random
+        self.bucket = TokenBucket(initial_rate or max_rate, burst, clock)
+        self.base_delay = base_delay
+        self.backoff = DecorrelatedJitterBackoff(base_delay or 0.0, max_delay, self.rng)
+        self.retrying = False
+
+        self.sent = 0
+        self.succeeded = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @property
+    def rate(self):
+        """Current send rate in messages per second."""
+        return self.bucket.rate
+
+    def _set_rate(self, rate):
+        self.bucket.set_rate(max(self.min_rate, min(self.max_rate, rate)))
+
+    def reserve(self):
+        """Reserve a send slot and return the seconds to wait before sending."""
+        delay = self.bucket.reserve()
+        if self.retrying:
+            self.retrying = False
+            delay += self.rng.uniform(0, 1.0 / self.rate)
+        return delay
+
+    def record(self, status_code, latency):
+        """
+        Feed a response back into the controller and adjust the rate.
+
+        Args:
+            status_code (int): HTTP status code, or None if the request raised
+            latency (float): Seconds the request took
+
+        Returns:
+            str: One of OUTCOME_OK, OUTCOME_THROTTLED, OUTCOME_RETRY or OUTCOME_FAILED
+        """
+        self.sent += 1
+        if status_code == 200:
+            self.succeeded += 1
+            self.backoff.reset()
+            if latency > self.latency_target:
+                self._set_rate(self.rate * self.latency_decrease)
+            else:
+                self._set_rate(self.rate + self.increase)
+            return OUTCOME_OK
+
+        if status_code in THROTTLE_STATUS_CODES:
+            self.throttled += 1
+            self._set_rate(self.rate * self.decrease)
+            return OUTCOME_THROTTLED
+
+        if status_code is None or status_code in RETRYABLE_STATUS_CODES:
+            return OUTCOME_RETRY
+
+        self.failed += 1
+        return OUTCOME_FAILED
+
+    def retry_delay(self):
+        """Return the seconds to wait before retrying, covering both backoff and pacing."""
+        self.retries += 1
+        self.retrying = True
+        base = self.base_delay if self.base_delay is not None else 1.0 / self.rate
+        return max(self.backoff.next_delay(base), self.bucket.wait_time())
+
+    def send(self, send_fn, sleep=time.sleep):
+        """
+        Send one message through the controller, retrying when appropriate.
+        The caller is expected to have waited for `reserve()` already.
+
+        Args:
+            send_fn (callable): Performs the request and returns an object with a `status_code`
+            sleep (callable): Used to wait between retries
+
+        Returns:
+            The last response, or None if every attempt raised
+        """
+        response = None
+        for attempt in range(self.max_retries + 1):
+            started_at = self.clock()
+            try:
+                response = send_fn()
+                status_code = response.status_code
+            except Exception as e:
+                logger.warning(f"Send attempt {attempt + 1} failed: {e}")
+                response = None
+                status_code = None
+            outcome = self.record(status_code, self.clock() - started_at)
+
+            if outcome in (OUTCOME_OK, OUTCOME_FAILED):
+                return response
+            if attempt == self.max_retries:
+                break
+
+            delay = self.retry_delay()
+            logger.info(f"Send {outcome} (status {status_code}), retrying in {delay:.2f}s at {self.rate:.3f} msg/s")
+            sleep(delay)
+
+        self.dropped += 1
+        logger.error(f"Giving up after {self.max_retries + 1} attempts")
+        return response
+
+    def stats(self):
+        """
+        Get the current rate and send counters.
+
+        Returns:
+            dict: Rate in messages per second and counters since creation
+        """
+        return {
+            'rate': self.rate,
+            'sent': self.sent,
+            'succeeded': self.succeeded,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'failed': self.failed,
+            'dropped': self.dropped,
+        }
+
+
+def simulate_fleet_recovery(devices=50000, interval=5.0, capacity=6000.0, outage=30.0,
+                            duration=240.0, latency=0.05, window=10.0, seed=0):
+    """
+    Simulate a fleet of adaptive publishers recovering from an endpoint outage.
+    The endpoint answers 503 during the outage and 429 to anything above
+    `capacity` messages per second afterwards.
+
+    Args:
+        devices (int): Number of simulated devices
+        interval (float): Nominal seconds between messages per device
+        capacity (float): Messages per second the endpoint accepts
+        outage (float): Seconds the endpoint is down at the start
+        duration (float): Simulated seconds to run
+        latency (float): Simulated response time in seconds
+        window (float): Seconds per reported row
+        seed (int): Seed for jitter and start phases
+
+    Returns:
+        list: One dict per window with offered and accepted rates and the mean device rate
+    """
+    rng = random.Random(seed)
+    now = [0.0]
+    clock = lambda: now[0]
+
+    controllers = [
+        AdaptiveSendController(1.0 / interval, clock=clock, rng=rng)
+        for _ in range(devices)
+    ]
+    attempts = [0] * devices
+    # Stagger device start times within one interval
+    events = [(rng.uniform(0, interval), i) for i in range(devices)]
+    heapq.heapify(events)
+
+    accepted_per_second = {}
+    windows = {}
+    while events:
+        t, i = heapq.heappop(events)
+        if t >= duration:
+            break
+        now[0] = t
+        second = int(t)
+        row = windows.setdefault(int(t // window), {'offered': 0, 'accepted': 0})
+        row['offered'] += 1
+
+        if t < outage:
+            status_code = 503
+        elif accepted_per_second.get(second, 0) >= capacity:
+            status_code = 429
+        else:
+            status_code = 200
+            accepted_per_second[second] = accepted_per_second.get(second, 0) + 1
+            row['accepted'] += 1
+
+        controller = controllers[i]
+        now[0] = t + latency
+        outcome = controller.record(status_code, latency)
+        if outcome in (OUTCOME_OK, OUTCOME_FAILED) or attempts[i] == controller.max_retries:
+            if outcome not in (OUTCOME_OK, OUTCOME_FAILED):
+                controller.dropped += 1
+            attempts[i] = 0
+            delay = controller.reserve()
+        else:
+            attempts[i] += 1
+            delay = controller.retry_delay()
+        heapq.heappush(events, (now[0] + delay, i))
+
+    report = []
+    for index in range(int(duration // window)):
+        row = windows.get(index, {'offered': 0, 'accepted': 0})
+        report.append({
+            'start': index * window,
+            'offered_rate': row['offered'] / window,
+            'accepted_rate': row['accepted'] / window,
+        })
+    mean_rate = sum(c.rate for c in controllers) / devices
+    if report:
+        report[-1]['mean_device_rate'] = mean_rate
+    return report
+
+
+def main():
+    """Run the fleet recovery simulation and print offered vs accepted load per window."""
+    parser = argparse.ArgumentParser(description="Simulate a fleet of adaptive publishers recovering from an outage")
+    parser.add_argument("--devices", type=int, default=50000, help="Number of simulated devices (default: 50000)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Nominal seconds between messages (default: 5)")
+    parser.add_argument("--capacity", type=float, default=6000.0, help="Endpoint capacity in messages per second (default: 6000)")
+    parser.add_argument("--outage", type=float, default=30.0, help="Seconds the endpoint is down (default: 30)")
+    parser.add_argument("--duration", type=float, default=240.0, help="Simulated seconds (default: 240)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+
+    report = simulate_fleet_recovery(args.devices, args.interval, args.capacity,
+                                     args.outage, args.duration, seed=args.seed)
+    print(f"{'Start (s)':<12} {'Offered (msg/s)':<18} {'Accepted (msg/s)':<18}")
+    print("-" * 48)
+    for row in report:
+        print(f"{row['start']:<12.0f} {row['offered_rate']:<18.1f} {row['accepted_rate']:<18.1f}")
+    if report:
+        print(f"\nMean device rate at end: {report[-1]['mean_device_rate']:.4f} msg/s")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
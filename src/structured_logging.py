@@ -0,0 +1,211 @@
+"""
+Sampled, lazily formatted structured logging for Lambda handlers.
+Records are kept or dropped per level according to sampling rates before
+anything is formatted, and records kept during one invocation are written
+together as a single JSON line when the handler returns. The invocation is
+held in a context variable, so work the handler hands to other threads with
+`contextvars.copy_context().run` logs into the same line.
+"""
+import contextvars
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+# Fraction of records kept per level, overridden per logger name with the
+# LOG_SAMPLE_RATES environment variable, e.g. '{"telemetry": {"INFO": 0.01}, "*": {"DEBUG": 0}}'
+DEFAULT_SAMPLE_RATES = {
+    'DEBUG': 0.0,
+    'INFO': 1.0,
+    'WARNING': 1.0,
+    'ERROR': 1.0,
+    'CRITICAL': 1.0,
+}
+
+_invocation = contextvars.ContextVar('invocation', default=None)
+_stats_lock = threading.Lock()
+_stats = {
+    'bytes_emitted': 0,
+    'lines_emitted': 0,
+    'records_emitted': 0,
+    'records_dropped': 0,
+}
+
+
+def stats():
+    """
+    Get counters for everything logged through this module since startup.
+
+    Returns:
+        dict: bytes_emitted, lines_emitted, records_emitted and records_dropped
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _emit(entry, records):
+    line = json.dumps(entry, default=str, separators=(',', ':')) + '\n'
+    # Look stdout up on every write so redirections apply
+    sys.stdout.write(line)
+    with _stats_lock:
+        _stats['bytes_emitted'] += len(line.encode('utf-8'))
+        _stats['lines_emitted'] += 1
+        _stats['records_emitted'] += records
+
+
+def _count_dropped(count):
+    with _stats_lock:
+        _stats['records_dropped'] += count
+
+
+def _format(record, started_at):
+    name, level, message, args, fields, logged_at = record
+    if args:
+        try:
+            message = message % args
+        except (TypeError, ValueError):
+            message = f"{message} {args}"
+    entry = {'level': level, 'logger': name, 'message': message}
+    if started_at is not None:
+        entry['t_ms'] = round((logged_at - started_at) * 1000, 2)
+    entry.update(fields)
+    return entry
+
+
+class _Invocation:
+    def __init__(self, handler, request_id):
+        self.handler = handler
+        self.request_id = request_id
+        self.started_at = time.monotonic()
+        self.records = []
+        self.dropped = 0
+        # Records can arrive from worker threads sharing the invocation
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def flush(self):
+        _count_dropped(self.dropped)
+        if not self.records:
+            return
+        entry = {
+            'handler': self.handler,
+            'request_id': self.request_id,
+            'duration_ms': round((time.monotonic() - self.started_at) * 1000, 2),
+            'dropped': self.dropped,
+            'records': [_format(record, self.started_at) for record in self.records],
+        }
+        _emit(entry, len(self.records))
+
+
+def log_invocation(handler=None, context=None):
+    """
+    Decorate a handler so records logged while it runs are written as one JSON line.
+    The request id is taken from a Lambda context argument when there is one,
+    otherwise from the Lambda context returned by `context`, for handlers such
+    as Chalice routes that are called without arguments:
+
+        @log_invocation(context=lambda: app.lambda_context)
+
+    Args:
+        handler (callable): Handler to decorate
+        context (callable): Returns the current Lambda context, or None
+    """
+    if handler is None:
+        return functools.partial(log_invocation, context=context)
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if _invocation.get() is not None:
+            return handler(*args, **kwargs)
+        request_id = next((arg.aws_request_id for arg in args if hasattr(arg, 'aws_request_id')), None)
+        if request_id is None and context is not None:
+            request_id = getattr(context(), 'aws_request_id', None)
+        invocation = _Invocation(handler.__name__, request_id)
+        token = _invocation.set(invocation)
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            _invocation.reset(token)
+            invocation.flush()
+    return wrapper
+
+
+def sample_rates(name, defaults=None):
+    """
+    Resolve the sampling rates for a logger.
+
+    Args:
+        name (str): Logger name, used to look up LOG_SAMPLE_RATES
+        defaults (dict): Rates for this logger overriding DEFAULT_SAMPLE_RATES
+
+    Returns:
+        dict: Level name to fraction of records kept
+    """
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    rates.update(defaults or {})
+    configured = json.loads(os.environ.get('LOG_SAMPLE_RATES') or '{}')
+    rates.update(configured.get('*', {}))
+    rates.update(configured.get(name, {}))
+    return rates
+
+
+class StructuredLogger:
+    """
+    Logger that samples records per level and formats only the ones it keeps.
+    Messages use %-style arguments, which are not applied until the record is written,
+    and keyword arguments become fields of the JSON record.
+    """
+
+    def __init__(self, name, defaults=None, rng=None):
+        """
+        Args:
+            name (str): Logger name, written with every record
+            defaults (dict): Sampling rates overriding DEFAULT_SAMPLE_RATES for this logger
+            rng (random.Random): Random source for sampling
+        """
+        self.name = name
+        self.rates = sample_rates(name, defaults)
+        self.random = (rng or random).random
+
+    def is_sampled(self, level):
+        """Decide whether a record at this level is kept."""
+        rate = self.rates.get(level, 1.0)
+        return rate >= 1.0 or (rate > 0.0 and self.random() < rate)
+
+    def log(self, level, message, *args, **fields):
+        """Log a record at the given level name."""
+        invocation = _invocation.get()
+        if not self.is_sampled(level):
+            if invocation is not None:
+                invocation.drop()
+            else:
+                _count_dropped(1)
+            return
+
+        record = (self.name, level, message, args, fields, time.monotonic())
+        if invocation is not None:
+            invocation.add(record)
+        else:
+            _emit(_format(record, None), 1)
+
+    def debug(self, message, *args, **fields):
+        self.log('DEBUG', message, *args, **fields)
+
+    def info(self, message, *args, **fields):
+        self.log('INFO', message, *args, **fields)
+
+    def warning(self, message, *args, **fields):
+        self.log('WARNING', message, *args, **fields)
+
+    def error(self, message, *args, **fields):
+        self.log('ERROR', message, *args, **fields)
@@ -0,0 +1,133 @@
+"""
+Round-trip and malformed payload tests for the time-series codec.
+
+    cd src
+    poetry run python3 -m unittest test_ts_codec
+"""
+import struct
+import unittest
+import numpy as np
+from ts_codec import MAGIC, MAX_READINGS, encode_readings, decode_readings, is_encoded
+
+COUNTS = [0, 1, 2, 3, 10, 1000]
+
+
+def make_readings(count, seed=0):
+    """Readings every 5 s with a little clock jitter and normally distributed temperatures."""
+    rng = np.random.default_rng(seed)
+    timestamps = 1_700_000_000_000 + np.arange(count, dtype=np.int64) * 5000 + rng.integers(-20, 20, count)
+    values = rng.normal(80, 10, count)
+    return timestamps, values
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def assert_round_trip(self, timestamps, values, decimals=None, device_id='device-000001'):
+        data = encode_readings(device_id, timestamps, values, decimals)
+        self.assertTrue(is_encoded(data))
+        decoded = decode_readings(data)
+        self.assertEqual(decoded['device_id'], device_id)
+        np.testing.assert_array_equal(decoded['timestamps'], np.asarray(timestamps, dtype=np.int64))
+        return decoded['values']
+
+    def test_xor_mode_is_bit_exact(self):
+        for count in COUNTS:
+            with self.subTest(count=count):
+                timestamps, values = make_readings(count)
+                decoded = self.assert_round_trip(timestamps, values)
+                np.testing.assert_array_equal(decoded.view(np.uint64), values.view(np.uint64))
+
+    def test_fixed_point_mode_rounds(self):
+        for count in COUNTS:
+            for decimals in (0, 1, 2):
+                with self.subTest(count=count, decimals=decimals):
+                    timestamps, values = make_readings(count)
+                    decoded = self.assert_round_trip(timestamps, values, decimals)
+                    np.testing.assert_allclose(decoded, np.round(values, decimals), rtol=0, atol=1e-9)
+
+    def test_empty_and_single_reading(self):
+        self.assertEqual(len(self.assert_round_trip([], [])), 0)
+        self.assertEqual(len(self.assert_round_trip([], [], decimals=1)), 0)
+        self.assertEqual(self.assert_round_trip([1000], [72.5]).tolist(), [72.5])
+        self.assertEqual(self.assert_round_trip([1000], [72.54], decimals=1).tolist(), [72.5])
+
+    def test_special_floats_in_xor_mode(self):
+        values = np.array([70.0, np.nan, np.inf, -np.inf, -0.0, 0.0, 70.0])
+        timestamps = np.arange(len(values), dtype=np.int64) * 5000
+        decoded = self.assert_round_trip(timestamps, values)
+        np.testing.assert_array_equal(decoded.view(np.uint64), values.view(np.uint64))
+
+    def test_constant_readings(self):
+        timestamps = np.arange(1000, dtype=np.int64) * 5000
+        for decimals in (None, 1):
+            with self.subTest(decimals=decimals):
+                decoded = self.assert_round_trip(timestamps, np.full(1000, 75.5), decimals)
+                np.testing.assert_array_equal(decoded, np.full(1000, 75.5))
+
+    def test_unicode_device_id(self):
+        self.assert_round_trip([1, 2], [1.0, 2.0], device_id='capteur-é')
+
+
+class EncodeErrorsTest(unittest.TestCase):
+
+    def test_mismatched_lengths(self):
+        with self.assertRaises(ValueError):
+            encode_readings('d', [1, 2, 3], [1.0, 2.0])
+
+    def test_decimals_out_of_range(self):
+        for decimals in (-1, 256):
+            with self.subTest(decimals=decimals), self.assertRaises(ValueError):
+                encode_readings('d', [1, 2], [1.0, 2.0], decimals)
+
+    def test_non_finite_values_in_fixed_point_mode(self):
+        for value in (np.nan, np.inf, -np.inf, 1e300):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                encode_readings('d', [1, 2], [1.0, value], 2)
+
+
+class DecodeErrorsTest(unittest.TestCase):
+
+    def test_not_a_payload(self):
+        for data in (b'', b'TSG', b'not a time-series payload'):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                decode_readings(data)
+
+    def test_every_truncation_raises(self):
+        timestamps, values = make_readings(50)
+        for decimals in (None, 1):
+            data = encode_readings('device-000001', timestamps, values, decimals)
+            for length in range(len(data)):
+                with self.subTest(decimals=decimals, length=length), self.assertRaises(ValueError):
+                    decode_readings(data[:length])
+
+    def test_unknown_mode(self):
+        data = bytearray(encode_readings('d', [1, 2], [1.0, 2.0]))
+        data[len(MAGIC)] = 7
+        with self.assertRaises(ValueError):
+            decode_readings(bytes(data))
+
+    def test_count_beyond_payload_is_rejected_before_allocating(self):
+        header = struct.Struct('<4sBBIH')
+        for mode, count in ((0, 2 ** 31), (1, 2 ** 31), (0, MAX_READINGS), (1, MAX_READINGS + 1)):
+            data = header.pack(MAGIC, mode, 0, count, 0) + bytes(40)
+            with self.subTest(mode=mode, count=count), self.assertRaises(ValueError):
+                decode_readings(data)
+
+    def test_corrupted_payloads_decode_or_raise_value_error(self):
+        rng = np.random.default_rng(1)
+        timestamps, values = make_readings(100)
+        for decimals in (None, 1):
+            data = encode_readings('device-000001', timestamps, values, decimals)
+            for _ in range(500):
+                corrupted = bytearray(data)
+                for position in rng.integers(0, len(data), rng.integers(1, 4)):
+                    corrupted[position] = rng.integers(0, 256)
+                try:
+                    decoded = decode_readings(bytes(corrupted))
+                except ValueError:
+                    continue
+                self.assertEqual(len(decoded['timestamps']), len(decoded['values']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+"""
+Topic routing and concurrent fan-out publishing for telemetry messages.
+A routing table of topic templates is compiled once per container, and the
+topics a message resolves to are published concurrently over one shared
+`iot-data` client so that N topics cost about one round trip.
+"""
+import contextvars
+import json
+import numbers
+import os
+import re
+import string
+from concurrent.futures import ThreadPoolExecutor
+from structured_logging import StructuredLogger
+
+logger = StructuredLogger('topic_routing')
+
+# Fields a topic template may reference
+TEMPLATE_FIELDS = {'device_id'}
+
+# Values substituted into topics come from the device, so they may not contain
+# topic separators, wildcards or anything else that changes the topic's shape
+SAFE_FIELD_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+DEFAULT_ROUTES = [
+    # Aggregate topic for every reading
+    {'topic': 'temperatures/json'},
+    # Per-device topic
+    {'topic': 'temperatures/{device_id}/json'},
+    # Alerts for readings outside the expected range
+    {'topic': 'alerts/{device_id}/temperature', 'alert': True},
+]
+
+
+class Route:
+    """A topic template and whether it only receives alerts."""
+
+    def __init__(self, topic, alert=False):
+        """
+        Args:
+            topic (str): Topic template, e.g. 'temperatures/{device_id}/json'
+            alert (bool): Only route messages with a reading outside the alert range
+
+        Raises:
+            ValueError: If the template references an unknown field
+        """
+        fields = {name for _, name, _, _ in string.Formatter().parse(topic) if name is not None}
+        unknown = fields - TEMPLATE_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown fields {sorted(unknown)} in topic template {topic}")
+        self.topic = topic
+        self.alert = alert
+        self.fields = fields
+
+    def topic_for(self, message):
+        """
+        Get the topic for a message.
+
+        Returns:
+            str: Topic name, or None if the message lacks a field the template needs
+
+        Raises:
+            ValueError: If a field value is not safe to put in a topic
+        """
+        values = {}
+        for field in self.fields:
+            value = message.get(field)
+            if value is None:
+                return None
+            if not isinstance(value, str) or not SAFE_FIELD_PATTERN.match(value):
+                raise ValueError(f"Invalid {field} {value!r}, only letters, digits, '_' and '-' are allowed")
+            values[field] = value
+        return self.topic.format(**values)
+
+
+def validate_message(message):
+    """
+    Check a telemetry message has the shape routing relies on.
+
+    Args:
+        message: Deserialized telemetry message
+
+    Raises:
+        ValueError: If the message is not a dict or its readings are not numbers
+    """
+    if not isinstance(message, dict):
+        raise ValueError(f"Message must be a dict, not {type(message).__name__}")
+    temperatures = message.get('temperatures')
+    if temperatures is None:
+        temperatures = [message.get('temperature')]
+    elif not isinstance(temperatures, list):
+        raise ValueError("temperatures must be a list")
+    for temperature in temperatures:
+        if temperature is not None and (isinstance(temperature, bool) or not isinstance(temperature, numbers.Real)):
+            raise ValueError(f"Invalid temperature {temperature!r}, readings must be numbers")
+
+
+class TopicRouter:
+    """Resolves the topics a telemetry message is published to."""
+
+    def __init__(self, routes, min_temperature=40.0, max_temperature=120.0):
+        """
+        Args:
+            routes (list): Route dicts with a 'topic' template and an optional 'alert' flag
+            min_temperature (float): Readings below this raise an alert
+            max_temperature (float): Readings above this raise an alert
+        """
+        self.routes = [Route(route['topic'], route.get('alert', False)) for route in routes]
+        self.min_temperature = min_temperature
+        self.max_temperature = max_temperature
+
+    def is_alert(self, message):
+        """Return True if any reading in the message is outside the alert range."""
+        temperatures = message.get('temperatures')
+        if temperatures is None:
+            temperatures = [message.get('temperature')]
+        return any(
+            t is not None and not self.min_temperature <= t <= self.max_temperature
+            for t in temperatures
+        )
+
+    def topics_for(self, message):
+        """
+        Get the topics a message should be published to. Routes whose template
+        needs a field the message does not have, or has a value that is not safe
+        to put in a topic, are skipped; the others still get the message.
+
+        Args:
+            message (dict): Telemetry message accepted by `validate_message`
+
+        Returns:
+            list: Topic names
+        """
+        alert = None
+        topics = []
+        for route in self.routes:
+            if route.alert:
+                if alert is None:
+                    alert = self.is_alert(message)
+                if not alert:
+                    continue
+            try:
+                topic = route.topic_for(message)
+            except ValueError as e:
+                logger.warning("Skipping route %s: %s", route.topic, e)
+                continue
+            if topic is None:
+                logger.warning("Skipping route %s, message has no %s", route.topic, ', '.join(sorted(route.fields)))
+                continue
+            topics.append(topic)
+        return topics
+
+
+def load_router():
+    """
+    Build a router from the environment.
+    TOPIC_ROUTES holds a JSON list of routes, DEFAULT_ROUTES is used when unset.
+
+    Returns:
+        TopicRouter: Compiled router
+    """
+    routes = DEFAULT_ROUTES
+    if os.environ.get('TOPIC_ROUTES'):
+        routes = json.loads(os.environ['TOPIC_ROUTES'])
+    return TopicRouter(
+        routes,
+        float(os.environ.get('ALERT_MIN_TEMPERATURE', 40)),
+        float(os.environ.get('ALERT_MAX_TEMPERATURE', 120)),
+    )
+
+
+class FanOutPublisher:
+    """Publishes one payload to many topics concurrently through a bounded thread pool."""
+
+    def __init__(self, client, max_workers=8):
+        """
+        Args:
+            client: Shared `iot-data` client, boto3 clients are safe to use across threads
+            max_workers (int): Most publishes in flight at once
+        """
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='iot-publish')
+
+    def _publish(self, topic, payload, qos):
+        try:
+            return self.client.publish(topic=topic, qos=qos, payload=payload)
+        except Exception as e:
+            logger.error("Failed to publish to %s: %s", topic, e)
+            return e
+
+    def publish(self, topics, payload, qos=1):
+        """
+        Publish a payload to every topic and wait for all of them.
+
+        Args:
+            topics (list): Topic names
+            payload (str): Message payload
+            qos (int): MQTT quality of service
+
+        Returns:
+            dict: Topic to publish response, or to the exception raised for that topic
+        """
+        if len(topics) == 1:
+            return {topics[0]: self._publish(topics[0], payload, qos)}
+        # Run each publish in a copy of the caller's context so failures are logged with its invocation
+        futures = [
+            self.executor.submit(contextvars.copy_context().run, self._publish, topic, payload, qos)
+            for topic in topics
+        ]
+        return {topic: future.result() for topic, future in zip(topics, futures)}
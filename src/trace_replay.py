@@ -0,0 +1,238 @@
+"""
+Replay harness for recorded workload traces.
+Feeds readings from a trace file in timestamp order, at a configurable
+speed-up, either through the device publisher or straight into
+`handle_iot_message` with stubbed AWS clients.
+"""
+import argparse
+import base64
+import contextlib
+import importlib.util
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+import numpy as np
+import structured_logging
+from rate_control import AdaptiveSendController
+from workload_trace import read_trace, device_name
+
+logger = logging.getLogger(__name__)
+
+# Readings converted from the memory-mapped columns at a time
+CHUNK_SIZE = 65536
+# Do not bother sleeping when less than this far ahead of schedule
+MIN_SLEEP = 0.001
+
+
+def load_publisher():
+    """Load publish-iot-message.py, which cannot be imported by name."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'publish-iot-message.py')
+    spec = importlib.util.spec_from_file_location('publish_iot_message', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class StubIotDataClient:
+    """Stands in for the `iot-data` client and counts what would have been published."""
+
+    def __init__(self):
+        self.published = Counter()
+        self.payload_bytes = 0
+        # Fan-out publishes arrive from several threads
+        self.lock = threading.Lock()
+
+    def publish(self, topic, qos, payload):
+        with self.lock:
+            self.published[topic] += 1
+            self.payload_bytes += len(payload)
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+
+class HandlerSink:
+    """Invokes `handle_iot_message` directly, the way the IoT rule would, with stubbed AWS clients."""
+
+    def __init__(self, decimals=None):
+        """
+        Args:
+            decimals (int): Fixed-point decimals for batched readings, exact floats if None
+        """
+        # Importing app builds boto3 clients, which only need a region to exist
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'ca-central-1')
+        os.environ.setdefault('IOT_CORE_ENDPOINT', 'localhost')
+        import app
+
+        self.app = app
+        # Encode exactly as the publisher does
+        self.encode_payload = load_publisher().encode_payload
+        self.decimals = decimals
+        self.iot_data_client = StubIotDataClient()
+        self.status_codes = Counter()
+        app.boto3 = SimpleNamespace(client=lambda *args, **kwargs: self.iot_data_client)
+        app.fan_out_publisher = None
+
+    def __call__(self, device_id, timestamps, temperatures):
+        payload = self.encode_payload(device_id, temperatures, timestamps, decimals=self.decimals)
+        event = {'data': base64.b64encode(payload).decode('utf-8')}
+        response = self.app.handle_iot_message(event, None)
+        self.status_codes[response['statusCode']] += 1
+
+    def stats(self):
+        """Return handler status codes and stub publish counts."""
+        return {
+            'status_codes': dict(self.status_codes),
+            'published_topics': len(self.iot_data_client.published),
+            'published': sum(self.iot_data_client.published.values()),
+            'published_bytes': self.iot_data_client.payload_bytes,
+        }
+
+
+class PublisherSink:
+    """Sends readings through `publish_iot_message` to the endpoint in a device configuration file."""
+
+    def __init__(self, config_path, topic, decimals=None, max_retries=5):
+        """
+        Args:
+            config_path (str): Device configuration JSON written by register_device.py
+            topic (str): Topic to publish to
+            decimals (int): Fixed-point decimals for batched readings, exact floats if None
+            max_retries (int): Retries per message on throttling or server errors
+        """
+        self.publisher = load_publisher()
+        config = self.publisher.load_config(config_path)
+        self.endpoint_url = config.get("endpoint")
+        self.root_cert = config.get("root_ca_path")
+        self.cert_pem = config.get("certificate_path")
+        self.private_pem = config.get("private_key_path")
+        self.topic = topic
+        self.decimals = decimals
+        # The replay paces sends, the controller only handles retries and backoff
+        self.controller = AdaptiveSendController(max_rate=1000.0, max_retries=max_retries)
+
+    def __call__(self, device_id, timestamps, temperatures):
+        self.publisher.publish_iot_message(
+            self.endpoint_url, device_id, self.topic, self.root_cert, self.cert_pem, self.private_pem,
+            self.controller, decimals=self.decimals, timestamps=timestamps, temperatures=temperatures
+        )
+
+    def stats(self):
+        """Return the send controller counters."""
+        return self.controller.stats()
+
+
+def replay(columns, sink, speedup=1.0, batch_size=1, limit=None, clock=time.monotonic, sleep=time.sleep):
+    """
+    Replay trace readings into a sink.
+
+    Args:
+        columns (dict): Trace columns as returned by `read_trace`
+        sink (callable): Called with (device_id, timestamps, temperatures) for each message
+        speedup (float): How many times faster than recorded to replay, 0 for as fast as possible
+        batch_size (int): Readings per device to collect before each message
+        limit (int): Stop after this many readings
+        clock (callable): Monotonic clock returning seconds
+        sleep (callable): Used to wait for readings that are not due yet
+
+    Returns:
+        dict: Readings and messages sent, elapsed seconds, throughput and the worst lag behind schedule
+    """
+    count = len(columns['timestamp'])
+    if limit is not None:
+        count = min(count, limit)
+    first_ms = int(columns['timestamp'][0]) if count else 0
+
+    buffers = {}
+    messages = 0
+    max_lag = 0.0
+    started_at = clock()
+    for start in range(0, count, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, count)
+        devices = columns['device'][start:end].tolist()
+        timestamps = columns['timestamp'][start:end].tolist()
+        temperatures = columns['temperature'][start:end].astype(np.float64).tolist()
+
+        for device, timestamp, temperature in zip(devices, timestamps, temperatures):
+            if speedup:
+                ahead = (timestamp - first_ms) / 1000 / speedup - (clock() - started_at)
+                if ahead > MIN_SLEEP:
+                    sleep(ahead)
+                else:
+                    max_lag = max(max_lag, -ahead)
+
+            buffer = buffers.setdefault(device, ([], []))
+            buffer[0].append(timestamp)
+            buffer[1].append(temperature)
+            if len(buffer[1]) >= batch_size:
+                del buffers[device]
+                sink(device_name(device), *buffer)
+                messages += 1
+
+    # Flush partial batches left at the end of the trace
+    for device, buffer in buffers.items():
+        sink(device_name(device), *buffer)
+        messages += 1
+
+    elapsed = clock() - started_at
+    return {
+        'readings': count,
+        'messages': messages,
+        'elapsed': elapsed,
+        'readings_per_second': count / elapsed if elapsed else 0.0,
+        'max_lag': max_lag,
+    }
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Replay a workload trace into the publisher or the Lambda handler")
+    parser.add_argument("--trace", required=True, help="Trace file written by workload_trace.py")
+    parser.add_argument("--target", choices=["handler", "publisher"], default="handler", help="Where to send readings (default: handler)")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Replay speed relative to recorded time, 0 for as fast as possible (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Readings per message (default: 1)")
+    parser.add_argument("--decimals", type=int, default=None, help="Fixed-point decimals for batched readings (default: exact)")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many readings")
+    parser.add_argument("--config", help="Device configuration JSON, required for the publisher target")
+    parser.add_argument("--topic", default="temperatures", help="Topic for the publisher target (default: temperatures)")
+    parser.add_argument("--log-level", default="WARNING", help="Log level while replaying (default: WARNING)")
+    parser.add_argument("--show-handler-logs", action="store_true", help="Print the handler's structured logs instead of discarding them")
+    return parser.parse_args()
+
+
+def main():
+    """Replay a trace file from command line arguments and print a summary."""
+    args = parse_args()
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.target == "publisher":
+        if not args.config:
+            logger.error("--config is required for the publisher target")
+            return 1
+        sink = PublisherSink(args.config, args.topic, args.decimals)
+    else:
+        sink = HandlerSink(args.decimals)
+    # app.py and the publisher set their own levels on import
+    logging.getLogger().setLevel(args.log_level)
+    logging.getLogger('publish_iot_message').setLevel(args.log_level)
+
+    columns, metadata = read_trace(args.trace)
+    print(f"Replaying {len(columns['timestamp'])} readings from {metadata.get('devices')} devices into {args.target}")
+    # The handler writes its structured logs to stdout
+    with open(os.devnull, 'w') as devnull:
+        output = contextlib.nullcontext() if args.show_handler_logs else contextlib.redirect_stdout(devnull)
+        with output:
+            result = replay(columns, sink, args.speedup, args.batch_size, args.limit)
+
+    print(f"Readings: {result['readings']}")
+    print(f"Messages: {result['messages']}")
+    print(f"Elapsed: {result['elapsed']:.2f}s ({result['readings_per_second']:,.0f} readings/s)")
+    print(f"Worst lag behind schedule: {result['max_lag']:.3f}s")
+    print(f"Sink: {sink.stats()}")
+    print(f"Structured logs: {structured_logging.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,249 @@
+"""
+Time-series codec for batched device readings.
+Timestamps are stored as delta-of-deltas and values as XORs against the
+previous value, in the style of Gorilla (Facebook's in-memory TSDB).
+Unlike Gorilla, every field in a payload shares one bit width so the whole
+payload decodes with a handful of vectorized NumPy operations instead of a
+bit-by-bit loop. An optional fixed-point mode rounds values to a number of
+decimals and stores their deltas instead of float XORs.
+"""
+import struct
+import numpy as np
+
+MAGIC = b'TSG1'
+
+MODE_XOR = 0
+MODE_FIXED_POINT = 1
+
+# Most readings in one payload. Constant fixed-point readings take no bits at
+# all, so the count in a header cannot be bounded by the payload size alone.
+MAX_READINGS = 1 << 20
+MAX_DECIMALS = 255
+# Fixed-point values are kept well inside int64 so their deltas cannot overflow
+_MAX_FIXED_POINT = 2 ** 62
+
+# magic, mode, decimals, reading count, device id length
+_HEADER = struct.Struct('<4sBBIH')
+# first timestamp (ms), first timestamp delta (ms), delta-of-delta bit width
+_TIMESTAMPS_HEADER = struct.Struct('<qqB')
+# first value bits, trailing zero bits dropped, xor bit width
+_XOR_HEADER = struct.Struct('<QBB')
+# first fixed-point value, delta bit width
+_FIXED_POINT_HEADER = struct.Struct('<qB')
+
+_SHIFTS = np.arange(63, -1, -1, dtype=np.uint64)
+
+
+def is_encoded(data):
+    """Return True if the bytes look like a payload produced by `encode_readings`."""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def _zigzag(values):
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(values):
+    return ((values >> np.uint64(1)) ^ (np.uint64(0) - (values & np.uint64(1)))).view(np.int64)
+
+
+def _bit_width(values):
+    return int(values.max()).bit_length() if len(values) else 0
+
+
+def _pack(values, width):
+    """Pack unsigned integers into a big-endian bit stream, `width` bits each."""
+    if width == 0 or len(values) == 0:
+        return b''
+    bits = ((values[:, None] >> _SHIFTS[64 - width:]) & np.uint64(1)).astype(np.uint8)
+    return np.packbits(bits.ravel()).tobytes()
+
+
+def _unpack(data, offset, count, width):
+    """
+    Read `count` unsigned integers of `width` bits each from `data` at `offset`.
+
+    Returns:
+        tuple: (uint64 array, offset just past the packed bytes)
+    """
+    if width == 0 or count == 0:
+        return np.zeros(count, dtype=np.uint64), offset
+    size = (count * width + 7) // 8
+    if offset + size > len(data):
+        raise ValueError("Truncated time-series payload")
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=size, offset=offset))
+    padded = np.zeros((count, 64), dtype=np.uint8)
+    padded[:, 64 - width:] = bits[:count * width].reshape(count, width)
+    values = np.packbits(padded, axis=1).view('>u8').ravel().astype(np.uint64)
+    return values, offset + size
+
+
+def _encode_timestamps(timestamps):
+    first = int(timestamps[0]) if len(timestamps) else 0
+    first_delta = int(timestamps[1] - timestamps[0]) if len(timestamps) > 1 else 0
+    dods = _zigzag(np.diff(timestamps, n=2))
+    width = _bit_width(dods)
+    return _TIMESTAMPS_HEADER.pack(first, first_delta, width) + _pack(dods, width)
+
+
+def _decode_timestamps(data, offset, count):
+    first, first_delta, width = _TIMESTAMPS_HEADER.unpack_from(data, offset)
+    offset += _TIMESTAMPS_HEADER.size
+    dods, offset = _unpack(data, offset, max(count - 2, 0), width)
+    deltas = np.empty(max(count - 1, 0), dtype=np.int64)
+    if count > 1:
+        deltas[0] = 0
+        np.cumsum(_unzigzag(dods), out=deltas[1:])
+        deltas += first_delta
+    timestamps = np.empty(count, dtype=np.int64)
+    if count:
+        timestamps[0] = 0
+        np.cumsum(deltas, out=timestamps[1:])
+        timestamps += first
+    return timestamps, offset
+
+
+def _encode_xor(values):
+    bits = values.view(np.uint64)
+    xors = bits[1:] ^ bits[:-1]
+    changed = xors != 0
+    nonzero = xors[changed]
+    trailing = 0
+    if len(nonzero):
+        combined = int(np.bitwise_or.reduce(nonzero))
+        trailing = (combined & -combined).bit_length() - 1
+    shifted = nonzero >> np.uint64(trailing)
+    width = _bit_width(shifted)
+    first = int(bits[0]) if len(bits) else 0
+    return (_XOR_HEADER.pack(first, trailing, width)
+            + np.packbits(changed).tobytes()
+            + _pack(shifted, width))
+
+
+def _decode_xor(data, offset, count):
+    first, trailing, width = _XOR_HEADER.unpack_from(data, offset)
+    offset += _XOR_HEADER.size
+    xors = np.zeros(count, dtype=np.uint64)
+    if count:
+        xors[0] = first
+    if count > 1:
+        size = (count - 1 + 7) // 8
+        if offset + size > len(data):
+            raise ValueError("Truncated time-series payload")
+        changed = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=size, offset=offset))[:count - 1].astype(bool)
+        offset += size
+        shifted, offset = _unpack(data, offset, int(changed.sum()), width)
+        xors[1:][changed] = shifted << np.uint64(trailing)
+    return np.bitwise_xor.accumulate(xors).view(np.float64), offset
+
+
+def _encode_fixed_point(values, decimals):
+    scaled = np.round(values * 10.0 ** decimals)
+    if not np.all(np.abs(scaled) < _MAX_FIXED_POINT):
+        raise ValueError(f"Values must be finite and fit in int64 at {decimals} decimals")
+    quantized = scaled.astype(np.int64)
+    deltas = _zigzag(np.diff(quantized))
+    width = _bit_width(deltas)
+    first = int(quantized[0]) if len(quantized) else 0
+    return _FIXED_POINT_HEADER.pack(first, width) + _pack(deltas, width)
+
+
+def _decode_fixed_point(data, offset, count, decimals):
+    first, width = _FIXED_POINT_HEADER.unpack_from(data, offset)
+    offset += _FIXED_POINT_HEADER.size
+    deltas, offset = _unpack(data, offset, max(count - 1, 0), width)
+    quantized = np.empty(count, dtype=np.int64)
+    if count:
+        quantized[0] = 0
+        np.cumsum(_unzigzag(deltas), out=quantized[1:])
+        quantized += first
+    return quantized / 10.0 ** decimals, offset
+
+
+def encode_readings(device_id, timestamps, values, decimals=None):
+    """
+    Encode a batch of readings from one device.
+
+    Args:
+        device_id (str): Device the readings belong to
+        timestamps (array-like): Reading times in integer milliseconds
+        values (array-like): Reading values
+        decimals (int): If set, round values to this many decimals and store them
+            as fixed-point deltas, otherwise store exact float XORs
+
+    Returns:
+        bytes: Encoded payload
+
+    Raises:
+        ValueError: If the readings or options cannot be encoded
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if timestamps.shape != values.shape or timestamps.ndim != 1:
+        raise ValueError("Timestamps and values must be 1-D arrays of the same length")
+    if len(values) > MAX_READINGS:
+        raise ValueError(f"At most {MAX_READINGS} readings fit in one payload")
+    if decimals is not None and not 0 <= decimals <= MAX_DECIMALS:
+        raise ValueError(f"Decimals must be between 0 and {MAX_DECIMALS}")
+
+    device_id_bytes = device_id.encode('utf-8')
+    if len(device_id_bytes) > 0xFFFF:
+        raise ValueError("Device id is too long")
+    mode = MODE_XOR if decimals is None else MODE_FIXED_POINT
+    header = _HEADER.pack(MAGIC, mode, decimals or 0, len(values), len(device_id_bytes))
+    if mode == MODE_XOR:
+        body = _encode_xor(values)
+    else:
+        body = _encode_fixed_point(values, decimals)
+    return header + device_id_bytes + _encode_timestamps(timestamps) + body
+
+
+def _check_count(data, offset, mode, count):
+    """Reject reading counts the payload cannot hold before anything is allocated."""
+    if count > MAX_READINGS:
+        raise ValueError(f"Time-series payload claims {count} readings, at most {MAX_READINGS} are allowed")
+    if mode == MODE_XOR and count > 1:
+        # Every reading after the first has a bit in the changed bitmap
+        required = _TIMESTAMPS_HEADER.size + _XOR_HEADER.size + (count - 1 + 7) // 8
+        if len(data) - offset < required:
+            raise ValueError("Truncated time-series payload")
+
+
+def decode_readings(data):
+    """
+    Decode a payload produced by `encode_readings`.
+
+    Args:
+        data (bytes): Encoded payload
+
+    Returns:
+        dict: device_id (str), timestamps (int64 ndarray, ms) and values (float64 ndarray)
+
+    Raises:
+        ValueError: If the payload is not a valid time-series payload
+    """
+    try:
+        magic, mode, decimals, count, device_id_length = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a time-series payload")
+        offset = _HEADER.size
+        device_id = bytes(data[offset:offset + device_id_length]).decode('utf-8')
+        offset += device_id_length
+        _check_count(data, offset, mode, count)
+
+        timestamps, offset = _decode_timestamps(data, offset, count)
+        if mode == MODE_XOR:
+            values, offset = _decode_xor(data, offset, count)
+        elif mode == MODE_FIXED_POINT:
+            values, offset = _decode_fixed_point(data, offset, count, decimals)
+        else:
+            raise ValueError(f"Unknown time-series encoding mode {mode}")
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed time-series payload: {e}")
+
+    return {
+        'device_id': device_id,
+        'timestamps': timestamps,
+        'values': values,
+    }
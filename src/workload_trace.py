@@ -0,0 +1,185 @@
+"""
+Deterministic workload traces for load testing.
+Generates per-device temperature streams with NumPy from a seed (baseline,
+drift, noise, outages and anomalies) and stores them in a compact columnar
+file that can be read back with memory mapping.
+"""
+import argparse
+import json
+import logging
+import struct
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'IOTTRACE'
+VERSION = 1
+# Columns start on this boundary so memory-mapped arrays are aligned
+ALIGNMENT = 64
+
+COLUMNS = [
+    ('device', np.uint32),
+    ('timestamp', np.int64),
+    ('temperature', np.float32),
+    ('anomaly', np.uint8),
+]
+
+_PREFIX = struct.Struct('<8sI')
+
+
+def generate_trace(devices, readings_per_device, interval=5.0, seed=0, start_ms=1_700_000_000_000,
+                   mean=80.0, spread=10.0, drift=0.05, noise=0.3, outage_rate=0.05,
+                   outage_length=120, anomaly_rate=0.001, anomaly_size=25.0):
+    """
+    Generate readings for a fleet of devices, ordered by timestamp.
+
+    Args:
+        devices (int): Number of devices
+        readings_per_device (int): Readings per device before outages are removed
+        interval (float): Seconds between readings of one device
+        seed (int): Seed for every random draw, the same seed gives the same trace
+        start_ms (int): Timestamp of the first reading in milliseconds
+        mean (float): Fleet mean temperature
+        spread (float): Standard deviation of each device's baseline around the mean
+        drift (float): Standard deviation of each step of the baseline random walk
+        noise (float): Standard deviation of per-reading noise
+        outage_rate (float): Fraction of devices that go silent once during the trace
+        outage_length (int): Mean number of readings lost per outage
+        anomaly_rate (float): Fraction of readings replaced by a spike
+        anomaly_size (float): Mean absolute size of a spike
+
+    Returns:
+        dict: One NumPy array per column in COLUMNS
+    """
+    rng = np.random.default_rng(seed)
+    shape = (devices, readings_per_device)
+    steps = np.arange(readings_per_device)
+
+    baseline = rng.normal(mean, spread, devices)[:, None]
+    walk = np.cumsum(rng.normal(0, drift, shape), axis=1)
+    temperature = np.clip(baseline + walk + rng.normal(0, noise, shape), 40, 120)
+
+    anomaly = rng.random(shape) < anomaly_rate
+    spikes = rng.choice([-1.0, 1.0], shape) * rng.exponential(anomaly_size, shape)
+    temperature = np.where(anomaly, temperature + spikes, temperature)
+
+    # Devices start out of phase and report with a little clock jitter
+    phase_ms = rng.uniform(0, interval * 1000, devices)[:, None]
+    jitter_ms = rng.normal(0, interval * 10, shape)
+    timestamp = (start_ms + phase_ms + steps * interval * 1000 + jitter_ms).astype(np.int64)
+
+    has_outage = rng.random(devices) < outage_rate
+    outage_start = rng.integers(0, max(readings_per_device, 1), devices)
+    outage_end = outage_start + rng.geometric(1 / max(outage_length, 1), devices)
+    online = ~(has_outage[:, None] & (steps >= outage_start[:, None]) & (steps < outage_end[:, None]))
+
+    device = np.broadcast_to(np.arange(devices, dtype=np.uint32)[:, None], shape)
+    order = np.argsort(timestamp[online], kind='stable')
+    return {
+        'device': device[online][order],
+        'timestamp': timestamp[online][order],
+        'temperature': temperature[online][order].astype(np.float32),
+        'anomaly': anomaly[online][order].astype(np.uint8),
+    }
+
+
+def device_name(index):
+    """Return the device id used for a device index in a trace."""
+    return f"device-{index:06d}"
+
+
+def write_trace(path, columns, metadata=None):
+    """
+    Write a trace to a columnar file.
+
+    Args:
+        path (str): Output file path
+        columns (dict): One array per column in COLUMNS, all the same length
+        metadata (dict): Extra JSON-serializable values stored in the header
+
+    Returns:
+        int: Number of readings written
+    """
+    count = len(columns['timestamp'])
+    header = {'version': VERSION, 'count': count, 'metadata': metadata or {}, 'columns': []}
+
+    # Offsets depend on the header size, so lay out with a placeholder first
+    header_size = 0
+    while True:
+        offset = _PREFIX.size + header_size
+        header['columns'] = []
+        for name, dtype in COLUMNS:
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            header['columns'].append({'name': name, 'dtype': np.dtype(dtype).str, 'offset': offset})
+            offset += count * np.dtype(dtype).itemsize
+        encoded = json.dumps(header).encode('utf-8')
+        if len(encoded) <= header_size:
+            break
+        header_size = -(-len(encoded) // ALIGNMENT) * ALIGNMENT
+
+    with open(path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, header_size))
+        f.write(encoded.ljust(header_size, b' '))
+        for (name, dtype), column in zip(COLUMNS, header['columns']):
+            f.write(b'\0' * (column['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+    logger.info(f"Wrote {count} readings to {path}")
+    return count
+
+
+def read_trace(path):
+    """
+    Memory-map a trace file written by `write_trace`.
+
+    Args:
+        path (str): Trace file path
+
+    Returns:
+        tuple: (dict of read-only memory-mapped column arrays, metadata dict)
+
+    Raises:
+        ValueError: If the file is not a trace file
+    """
+    with open(path, 'rb') as f:
+        magic, header_size = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        header = json.loads(f.read(header_size))
+
+    count = header['count']
+    columns = {}
+    for column in header['columns']:
+        if count == 0:
+            columns[column['name']] = np.empty(0, dtype=column['dtype'])
+            continue
+        columns[column['name']] = np.memmap(path, dtype=column['dtype'], mode='r',
+                                            offset=column['offset'], shape=(count,))
+    return columns, header['metadata']
+
+
+def main():
+    """Generate a trace file from command line arguments."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Generate a deterministic temperature workload trace")
+    parser.add_argument("--output", required=True, help="Path of the trace file to write")
+    parser.add_argument("--devices", type=int, default=1000, help="Number of devices (default: 1000)")
+    parser.add_argument("--readings", type=int, default=1000, help="Readings per device (default: 1000)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between readings (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--outage-rate", type=float, default=0.05, help="Fraction of devices with an outage (default: 0.05)")
+    parser.add_argument("--anomaly-rate", type=float, default=0.001, help="Fraction of anomalous readings (default: 0.001)")
+    args = parser.parse_args()
+
+    columns = generate_trace(args.devices, args.readings, args.interval, args.seed,
+                             outage_rate=args.outage_rate, anomaly_rate=args.anomaly_rate)
+    write_trace(args.output, columns, {
+        'devices': args.devices,
+        'interval': args.interval,
+        'seed': args.seed,
+    })
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())